@@ -0,0 +1,570 @@
+"""
+Box Dataset Loader
+------------------
+
+Shared loading code for the box databases, used by the generator, the
+statistics script, the API importer and the palletizing algorithms.
+
+📄 Formats:
+- `.xlsx`, `.csv`, `.parquet`, `.ndjson` – read with pandas.
+- `.boxcol` – compact binary columnar format for the 17-column box schema,
+  opened memory-mapped so numeric columns are zero-copy views of the file.
+
+🗂️ `.boxcol` layout:
+- 8-byte magic `BOXCOL01`, then the header length as a little-endian uint64.
+- A JSON header with the row count and, for every column, its dtype, byte
+  offset, byte size, encoding and (for categorical columns) its dictionary.
+- Column data, each column starting on a 64-byte boundary:
+  - fixed-width little-endian numerics (Box ID is stored as its number),
+  - Material/Color/Country as int8 codes into the header dictionary,
+  - Yes/No flags bit-packed, 8 rows per byte (numpy.packbits order).
+
+🔧 How to Use:
+   from box_dataset import load_boxes, open_boxcol
+   df = load_boxes("boxes_database/boxes_database_50.000.xlsx")   # any format -> DataFrame
+   boxes = open_boxcol("boxes_50000.boxcol")                        # memory-mapped columns
+   lengths = boxes.column("length")
+
+Convert an existing dataset from the command line:
+   python box_dataset.py boxes_database/boxes_database_50.000.xlsx
+
+⚡ Conversion cache:
+load_boxes() and open_boxes() convert `.xlsx` (and the other text formats) to a
+`.boxcol` sidecar on first use, keyed by the SHA-256 of the file content, and
+read the sidecar on later loads. The conversion streams the file in chunks
+(see iter_frames()), so it never holds the whole dataset in memory. Sidecars live in `BOX_CACHE_DIR`
+(default `~/.cache/box_dataset`); the least recently used ones are evicted once
+the cache exceeds `BOX_CACHE_MAX_BYTES` (default 1 GiB). Hit/miss counts:
+   python box_dataset.py --cache-info
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import zipfile
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils.exceptions import InvalidFileException
+
+# Column names of the exported datasets
+columns = [
+    "Box ID", "Length (cm)", "Width (cm)", "Height (cm)", "Thickness (cm)",
+    "External Volume (L)", "Internal Volume (L)", "Max Load Capacity (kg)",
+    "Material", "Fragile", "Stackable",
+    "Waterproof", "Fire Retardant",
+    "Min Temperature (°C)", "Max Temperature (°C)",
+    "Color", "Country of Origin"
+]
+
+# Keys of the columnar representation, in the same order as `columns`
+column_keys = [
+    "box_index", "length", "width", "height", "thickness",
+    "ext_volume", "int_volume", "max_load",
+    "material", "fragile", "stackable",
+    "waterproof", "fire_retardant",
+    "min_temp", "max_temp",
+    "color", "country"
+]
+
+flag_keys = ["fragile", "stackable", "waterproof", "fire_retardant"]
+# Value of a flag cell that is neither Yes nor No (e.g. empty); a box is stackable unless marked No
+flag_defaults = {"fragile": False, "stackable": True, "waterproof": False, "fire_retardant": False}
+dictionary_keys = ["material", "color", "country"]
+
+# Storage dtype of every non-flag column in a .boxcol file
+column_dtypes = {
+    "box_index": "<i8",
+    "length": "<i2", "width": "<i2", "height": "<i2",
+    "thickness": "<f8", "ext_volume": "<f8", "int_volume": "<f8", "max_load": "<f8",
+    "material": "i1", "color": "i1", "country": "i1",
+    "min_temp": "<i2", "max_temp": "<i2",
+}
+
+BOX_ID_PREFIX = "BX"
+BOX_ID_WIDTH = 6
+
+# Raised for a dataset that cannot be read or converted, e.g. a corrupt .xlsx
+# (not a zip file) or columns that do not fit the box schema
+DATASET_ERRORS = (KeyError, ValueError, zipfile.BadZipFile, InvalidFileException)
+
+MAGIC = b"BOXCOL01"
+# Part of every cached sidecar's name; bump it when frame_to_columns() encodes a source differently
+CACHE_FORMAT = 2
+ALIGNMENT = 64
+
+
+def format_box_ids(box_index):
+    """Render Box ID numbers as "BX{i:06d}" strings."""
+    return np.char.add(BOX_ID_PREFIX, np.char.zfill(np.asarray(box_index).astype(str), BOX_ID_WIDTH))
+
+
+def columns_to_frame(boxes, dictionaries):
+    """Turn a columnar dict (see `column_keys`) into the 17-column export layout.
+
+    `dictionaries` maps Material/Color/Country keys to the value list their codes index.
+    """
+    data = {"box_index": format_box_ids(boxes["box_index"])}
+    for key in dictionary_keys:
+        data[key] = np.asarray(dictionaries[key], dtype=object)[boxes[key]]
+    for key in flag_keys:
+        data[key] = np.where(boxes[key], "Yes", "No").astype(object)
+    for key in ("length", "width", "height", "min_temp", "max_temp"):
+        # Widen the int16 storage so arithmetic such as length * width * height cannot overflow
+        data[key] = np.asarray(boxes[key], dtype=np.int64)
+    return pd.DataFrame({
+        name: data.get(key, boxes.get(key)) for name, key in zip(columns, column_keys)
+    })
+
+
+def frame_to_columns(df, dictionaries=None):
+    """Encode a DataFrame with the 17 export columns into a columnar dict.
+
+    Returns `(boxes, dictionaries)`. Categorical values are coded against the
+    given dictionaries, extended with any value they do not contain yet.
+    """
+    dictionaries = {key: list((dictionaries or {}).get(key, [])) for key in dictionary_keys}
+    boxes = {}
+    for name, key in zip(columns, column_keys):
+        values = df[name]
+        if key == "box_index":
+            ids = values.astype(str)
+            if not ids.str.fullmatch(BOX_ID_PREFIX + r"\d+").all():
+                raise ValueError(f"Box IDs must look like {BOX_ID_PREFIX}000123")
+            boxes[key] = ids.str[len(BOX_ID_PREFIX):].astype(np.int64).to_numpy()
+        elif key in flag_keys:
+            values = values.astype(str).str.strip().str.lower()
+            flags = values != "no" if flag_defaults[key] else values == "yes"
+            boxes[key] = flags.to_numpy()
+        elif key in dictionary_keys:
+            values = values.astype(str)
+            for value in pd.unique(values):
+                if value not in dictionaries[key]:
+                    dictionaries[key].append(value)
+            codes = {value: code for code, value in enumerate(dictionaries[key])}
+            boxes[key] = values.map(codes).to_numpy().astype(column_dtypes[key])
+        else:
+            number = values.to_numpy(dtype=np.float64)
+            dtype = np.dtype(column_dtypes[key])
+            if dtype.kind == "i" and not np.array_equal(number, np.round(number)):
+                raise ValueError(f"column '{name}' must hold whole numbers")
+            boxes[key] = number.astype(dtype)
+    return boxes, dictionaries
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _layout(n_rows, dictionaries):
+    """Header entries and total file size for an `n_rows` dataset."""
+    entries = []
+    offset = 0
+    for key in column_keys:
+        if key in flag_keys:
+            entry = {"key": key, "encoding": "bitpacked", "dtype": "u1", "nbytes": -(-n_rows // 8)}
+        else:
+            dtype = np.dtype(column_dtypes[key])
+            entry = {"key": key, "encoding": "plain", "dtype": column_dtypes[key], "nbytes": n_rows * dtype.itemsize}
+            if key in dictionary_keys:
+                entry["encoding"] = "dictionary"
+                entry["dictionary"] = list(dictionaries[key])
+        entry["offset"] = offset
+        offset = _aligned(offset + entry["nbytes"])
+        entries.append(entry)
+
+    header = {"rows": n_rows, "columns": entries}
+    data_start = _aligned(len(MAGIC) + 8 + len(json.dumps(header).encode("utf-8")))
+    header["data_start"] = data_start
+    # The header length can only grow by the digits of data_start; re-align until it is stable
+    while len(MAGIC) + 8 + len(json.dumps(header).encode("utf-8")) > data_start:
+        data_start += ALIGNMENT
+        header["data_start"] = data_start
+    return header, data_start + offset
+
+
+class BoxcolWriter:
+    """Writes an `n_rows` .boxcol file chunk by chunk, in row order.
+
+    The file is allocated up front and every column is filled in place, so
+    memory use is bounded by one chunk.
+    """
+
+    def __init__(self, file_name, n_rows, dictionaries):
+        if any(len(dictionaries[key]) > 127 for key in dictionary_keys):
+            raise ValueError("dictionary columns are limited to 127 distinct values")
+        self.header, size = _layout(n_rows, dictionaries)
+        self.n_rows = n_rows
+        self.rows_written = 0
+        self.pending_flags = {key: np.zeros(0, dtype=bool) for key in flag_keys}
+        self.file = open(file_name, "w+b")
+        self.file.truncate(size)
+        header = json.dumps(self.header).encode("utf-8")
+        self.file.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        self.file.flush()
+        self.map = mmap.mmap(self.file.fileno(), size) if size else None
+        self.entries = {entry["key"]: entry for entry in self.header["columns"]}
+
+    def _view(self, key, dtype, start, count):
+        entry = self.entries[key]
+        offset = self.header["data_start"] + entry["offset"] + start * np.dtype(dtype).itemsize
+        return np.frombuffer(self.map, dtype=dtype, count=count, offset=offset)
+
+    def write(self, boxes):
+        count = len(boxes["box_index"])
+        if self.rows_written + count > self.n_rows:
+            raise ValueError(f"more than the declared {self.n_rows} rows written")
+        start = self.rows_written
+        for key in column_keys:
+            if key in flag_keys:
+                # Pack whole bytes only; carry the remaining < 8 rows over to the next chunk
+                bits = np.concatenate([self.pending_flags[key], np.asarray(boxes[key], dtype=bool)])
+                whole = len(bits) // 8 * 8
+                if whole:
+                    self._view(key, "u1", (start - len(self.pending_flags[key])) // 8, whole // 8)[:] = \
+                        np.packbits(bits[:whole])
+                self.pending_flags[key] = bits[whole:]
+            else:
+                self._view(key, column_dtypes[key], start, count)[:] = boxes[key]
+        self.rows_written += count
+
+    def close(self):
+        if self.map is not None:
+            for key, bits in self.pending_flags.items():
+                if len(bits):
+                    self._view(key, "u1", self.rows_written // 8, 1)[:] = np.packbits(bits)
+            self.map.flush()
+            self.map.close()
+        self.file.close()
+        if self.rows_written != self.n_rows:
+            raise ValueError(f"{self.rows_written} rows written, {self.n_rows} declared")
+
+
+def write_boxcol(file_name, boxes, dictionaries):
+    """Write a complete columnar dict to a .boxcol file."""
+    writer = BoxcolWriter(file_name, len(boxes["box_index"]), dictionaries)
+    writer.write(boxes)
+    writer.close()
+
+
+class BoxDataset:
+    """A memory-mapped .boxcol file. Use open_boxcol() to create one."""
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        with open(file_name, "rb") as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError(f"'{file_name}' is not a .boxcol file")
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            self.header = json.loads(f.read(header_length).decode("utf-8"))
+            size = os.fstat(f.fileno()).st_size
+            self.map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else None
+        self.rows = self.header["rows"]
+        self.entries = {entry["key"]: entry for entry in self.header["columns"]}
+        self.dictionaries = {key: self.entries[key]["dictionary"] for key in dictionary_keys}
+
+    def __len__(self):
+        return self.rows
+
+    def raw(self, key):
+        """The stored bytes of a column as a read-only numpy view (flags stay bit-packed)."""
+        entry = self.entries[key]
+        dtype = np.dtype(entry["dtype"])
+        return np.frombuffer(self.map, dtype=dtype, count=entry["nbytes"] // dtype.itemsize,
+                             offset=self.header["data_start"] + entry["offset"])
+
+    def column(self, key, start=0, stop=None):
+        """Rows [start, stop) of a column. Zero-copy except for the unpacked flags."""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        if key not in flag_keys:
+            return self.raw(key)[start:stop]
+        packed = self.raw(key)[start // 8:-(-stop // 8)]
+        return np.unpackbits(packed, count=stop - start // 8 * 8)[start % 8:].astype(bool)
+
+    def columns(self, start=0, stop=None):
+        """Rows [start, stop) as a columnar dict."""
+        return {key: self.column(key, start, stop) for key in column_keys}
+
+    def iter_chunks(self, chunk_size=100_000):
+        """Yield the dataset as consecutive columnar dicts of at most `chunk_size` rows."""
+        for start in range(0, self.rows, chunk_size):
+            yield self.columns(start, start + chunk_size)
+
+    def to_frame(self):
+        """The whole dataset in the 17-column export layout."""
+        return columns_to_frame(self.columns(), self.dictionaries)
+
+
+def open_boxcol(file_name):
+    return BoxDataset(file_name)
+
+
+def read_frame(file_name):
+    """Read any supported dataset file into a DataFrame, without caching."""
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == ".boxcol":
+        return open_boxcol(file_name).to_frame()
+    if extension in (".xlsx", ".xls"):
+        return pd.read_excel(file_name)
+    if extension == ".csv":
+        return pd.read_csv(file_name)
+    if extension == ".parquet":
+        return pd.read_parquet(file_name)
+    if extension in (".ndjson", ".jsonl"):
+        return pd.read_json(file_name, lines=True)
+    raise ValueError(f"unsupported dataset format '{extension}'")
+
+
+def _excel_frames(file_name, chunk_rows):
+    """Consecutive DataFrames of an .xlsx sheet, read row by row with openpyxl."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def iter_frames(file_name, chunk_rows=100_000):
+    """Read a dataset file as consecutive DataFrames of at most `chunk_rows` rows.
+
+    Only one chunk is held in memory, except for legacy .xls files which
+    pandas can only read whole.
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == ".boxcol":
+        dataset = open_boxcol(file_name)
+        for chunk in dataset.iter_chunks(chunk_rows):
+            yield columns_to_frame(chunk, dataset.dictionaries)
+    elif extension == ".xlsx":
+        yield from _excel_frames(file_name, chunk_rows)
+    elif extension == ".csv":
+        yield from pd.read_csv(file_name, chunksize=chunk_rows)
+    elif extension == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(file_name).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    elif extension in (".ndjson", ".jsonl"):
+        with pd.read_json(file_name, lines=True, chunksize=chunk_rows) as reader:
+            yield from reader
+    else:
+        yield read_frame(file_name)
+
+
+def stream_to_boxcol(file_name, output, chunk_rows=100_000):
+    """Convert a dataset file to .boxcol holding one chunk in memory at a time.
+
+    A first pass counts the rows and collects the Material/Color/Country
+    dictionaries the header needs up front; the second pass encodes each
+    chunk against them and writes it in place.
+    """
+    n_rows = 0
+    dictionaries = {key: [] for key in dictionary_keys}
+    for df in iter_frames(file_name, chunk_rows):
+        n_rows += len(df)
+        for name, key in zip(columns, column_keys):
+            if key in dictionary_keys:
+                for value in pd.unique(df[name].astype(str)):
+                    if value not in dictionaries[key]:
+                        dictionaries[key].append(value)
+    writer = BoxcolWriter(output, n_rows, dictionaries)
+    try:
+        for df in iter_frames(file_name, chunk_rows):
+            writer.write(frame_to_columns(df, dictionaries)[0])
+    finally:
+        writer.close()
+    return output
+
+
+# --- Conversion cache -------------------------------------------------------
+# Non-.boxcol datasets are converted once to a .boxcol sidecar named after the
+# SHA-256 of the file content, so a changed file simply misses and is rebuilt.
+# The least recently used sidecars are evicted once the cache outgrows its cap.
+CACHE_DIR = os.environ.get("BOX_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "box_dataset"))
+CACHE_MAX_BYTES = int(os.environ.get("BOX_CACHE_MAX_BYTES", 1024 ** 3))
+
+# Counters for this process; cache_info() also reports the totals across runs
+cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def content_hash(file_name):
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_entries():
+    """(path, size, last use) of every cached sidecar, least recently used first."""
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(".boxcol"):
+            path = os.path.join(CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # evicted by another process meanwhile
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+    return sorted(entries, key=lambda entry: entry[2])
+
+
+def _evict(keep):
+    """Remove least recently used sidecars until the cache fits CACHE_MAX_BYTES."""
+    entries = _cache_entries()
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for path, size, _ in entries:
+        if total <= CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        evicted += 1
+    return evicted
+
+
+def _record(**counts):
+    """Add to this process's counters and to the totals kept in the cache directory."""
+    for name, count in counts.items():
+        cache_stats[name] += count
+    stats_file = os.path.join(CACHE_DIR, "stats.json")
+    try:
+        with open(stats_file) as f:
+            totals = json.load(f)
+    except (FileNotFoundError, ValueError):
+        totals = {}
+    for name, count in counts.items():
+        totals[name] = totals.get(name, 0) + count
+    temporary = f"{stats_file}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(totals, f)
+    os.replace(temporary, stats_file)
+
+
+def cached_boxcol(file_name):
+    """Path of the .boxcol sidecar for `file_name`, converting it on a cache miss.
+
+    Returns None when the dataset cannot be stored as .boxcol (for example Box
+    IDs without the BX prefix); callers then fall back to the source file.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{content_hash(file_name)}.{CACHE_FORMAT}.boxcol")
+    if os.path.exists(path):
+        try:
+            os.utime(path)  # mark as recently used
+            _record(hits=1)
+            return path
+        except FileNotFoundError:  # evicted by another process meanwhile
+            pass
+
+    # Write under a temporary name so concurrent readers never see a partial sidecar
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        stream_to_boxcol(file_name, temporary)
+    except DATASET_ERRORS:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        _record(misses=1)
+        return None
+    os.replace(temporary, path)
+    _record(misses=1, evictions=_evict(keep=path))
+    return path
+
+
+def cache_info():
+    """Hit/miss/eviction counts (this process and all runs) and the cache size."""
+    try:
+        with open(os.path.join(CACHE_DIR, "stats.json")) as f:
+            totals = json.load(f)
+    except (FileNotFoundError, ValueError):
+        totals = {}
+    entries = _cache_entries()
+    return {
+        "directory": CACHE_DIR,
+        "entries": len(entries),
+        "bytes": sum(size for _, size, _ in entries),
+        "max_bytes": CACHE_MAX_BYTES,
+        "process": dict(cache_stats),
+        "total": {name: totals.get(name, 0) for name in cache_stats},
+    }
+
+
+def open_boxes(file_name, cache=True):
+    """Open any supported dataset as a memory-mapped BoxDataset.
+
+    Non-.boxcol files go through the conversion cache; None is returned when
+    a file cannot be represented as .boxcol.
+    """
+    if os.path.splitext(file_name)[1].lower() == ".boxcol":
+        return open_boxcol(file_name)
+    if not cache:
+        boxes, dictionaries = frame_to_columns(read_frame(file_name))
+        return _InMemoryDataset(boxes, dictionaries)
+    path = cached_boxcol(file_name)
+    return open_boxcol(path) if path else None
+
+
+class _InMemoryDataset(BoxDataset):
+    """A BoxDataset backed by arrays in memory instead of a mapped file."""
+
+    def __init__(self, boxes, dictionaries):
+        self.file_name = None
+        self.boxes = boxes
+        self.rows = len(boxes["box_index"])
+        self.dictionaries = dictionaries
+
+    def column(self, key, start=0, stop=None):
+        return self.boxes[key][start:stop]
+
+
+def load_boxes(file_name, cache=True):
+    """Load a box dataset of any supported format as a DataFrame with the 17 export columns.
+
+    Excel and other text formats are read through the conversion cache: the
+    first load converts them to a .boxcol sidecar, later loads of the same
+    content read the sidecar instead of parsing the file again.
+    """
+    dataset = open_boxes(file_name, cache=cache) if cache else None
+    if dataset is None:
+        return read_frame(file_name)
+    return dataset.to_frame()
+
+
+def convert_to_boxcol(file_name, output=None):
+    """Convert a dataset file to .boxcol (next to it unless `output` is given)."""
+    output = output or os.path.splitext(file_name)[0] + ".boxcol"
+    return stream_to_boxcol(file_name, output)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--cache-info"]:
+        print(json.dumps(cache_info(), indent=2))
+        sys.exit(0)
+    if len(sys.argv) < 2:
+        print("Usage: python box_dataset.py DATASET [DATASET ...] | --cache-info")
+        sys.exit(1)
+    for dataset in sys.argv[1:]:
+        print(f"✅ '{dataset}' converted to '{convert_to_boxcol(dataset)}'")
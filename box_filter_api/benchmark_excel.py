@@ -0,0 +1,96 @@
+# benchmark_excel.py
+"""
+Compare the two ways of building the /download/excel response:
+
+- pandas:    the previous endpoint, inlined: SELECT * ... ORDER BY RANDOM() into a list of
+             dicts, random.choices(), DataFrame -> pd.ExcelWriter into a BytesIO
+- streaming: stream_xlsx(), rows written from the cursor into a write-only workbook
+
+🔧 Usage (from the box_filter_api folder, with packages.db imported):
+   python benchmark_excel.py                      # 10k and 100k rows
+   python benchmark_excel.py --rows 10000 500000 --db /data/packages.db
+
+Every measurement runs in its own process, so the peak RSS reported is the
+growth of that process while producing the file. Rows are sampled with
+replacement, so any table size can produce any number of rows.
+"""
+import argparse
+import json
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+import main
+
+PATHS = ("pandas", "streaming")
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # kB on Linux
+
+
+def pandas_excel(rows):
+    """The endpoint as it was before streaming: every box, shuffled in SQL, then sampled."""
+    import pandas as pd
+
+    conn = sqlite3.connect(main.DB_NAME)
+    cursor = conn.execute("SELECT * FROM boxes WHERE 1=1 ORDER BY RANDOM()")
+    columns = [desc[0] for desc in cursor.description]
+    raw_results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    conn.close()
+    results = random.choices(raw_results, k=rows)
+
+    df = pd.DataFrame(results)
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False, sheet_name="Boxes")
+    return len(output.getvalue())
+
+
+def streaming_excel(rows):
+    batches = main.query_batches({}, rows, sample_with_replacement=True)
+    return sum(len(chunk) for chunk in main.stream_xlsx(batches))
+
+
+def measure(path, rows):
+    """Run one path in this process and return its timing and memory."""
+    if path == "pandas":
+        import pandas  # noqa: F401 -- import cost is not part of the measurement
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    size = pandas_excel(rows) if path == "pandas" else streaming_excel(rows)
+    return {
+        "path": path,
+        "rows": rows,
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb() - baseline,
+        "bytes": size,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Excel export paths.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000], help="rows per export")
+    parser.add_argument("--db", default=main.DB_NAME, help=f"SQLite database file (default: {main.DB_NAME})")
+    parser.add_argument("--run", choices=PATHS, help=argparse.SUPPRESS)  # child process mode
+    args = parser.parse_args()
+    main.DB_NAME = args.db
+
+    if args.run:
+        print(json.dumps(measure(args.run, args.rows[0])))
+        sys.exit(0)
+
+    print(f"{'rows':>9} {'path':>10} {'seconds':>9} {'peak RSS (MB)':>14} {'size (MB)':>10}")
+    for rows in args.rows:
+        for path in PATHS:
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", path, "--rows", str(rows), "--db", args.db],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output)
+            print(f"{rows:>9} {path:>10} {result['seconds']:>9.2f} {result['peak_rss_mb']:>14.1f} "
+                  f"{result['bytes'] / 1e6:>10.2f}")
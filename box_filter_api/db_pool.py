@@ -0,0 +1,81 @@
+# db_pool.py
+"""
+Pool of long-lived, read-only SQLite connections for the filter API.
+
+Connections are opened lazily (up to `size`), in read-only URI mode and with
+check_same_thread=False, so a streamed response can use its connection from
+any worker thread. Keeping them open lets SQLite's per-connection statement
+cache reuse the prepared sampling and lookup queries across requests.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+STATEMENT_CACHE = 256  # prepared statements kept per connection
+
+
+class PoolExhausted(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, db_name, size, timeout=30.0):
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()  # most recently used first: its page cache is warm
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            f"{Path(self.db_name).resolve().as_uri()}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE,
+        )
+        conn.execute("PRAGMA cache_size=-65536")  # 64 MiB
+        conn.execute("PRAGMA mmap_size=268435456")
+        return conn
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.opened < self.size:
+                self.opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self.opened -= 1
+                    raise
+        try:
+            return self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolExhausted(f"no database connection free after {self.timeout} s") from None
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self.idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self.lock:
+                self.opened -= 1
@@ -0,0 +1,182 @@
+# exports.py
+"""
+Typed download formats for the filter API: NDJSON, Arrow IPC stream and Parquet,
+plus the zip archive of the batch download.
+
+Every encoder takes the output of main.query_batches() (the column names,
+then batches of rows) and yields bytes as the batches arrive:
+
+- Fragile, Stackable, Waterproof and Fire Retardant become booleans
+- Material, Color and Country of Origin are dictionary-encoded (int8 codes)
+- dimensions and temperatures are int16, volumes, thickness and load float64
+
+pyarrow is only needed for Arrow and Parquet; check pyarrow_available()
+before starting one of those responses.
+"""
+import importlib.util
+import json
+import zipfile
+
+ARROW_BATCH_ROWS = 65_536  # rows per Arrow record batch / Parquet row group
+
+flag_columns = ["Fragile", "Stackable", "Waterproof", "Fire Retardant"]
+category_columns = ["Material", "Color", "Country of Origin"]
+int16_columns = ["Length (cm)", "Width (cm)", "Height (cm)", "Min Temperature (°C)", "Max Temperature (°C)"]
+float_columns = ["Thickness (cm)", "External Volume (L)", "Internal Volume (L)", "Max Load Capacity (kg)"]
+
+
+def pyarrow_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def stream_ndjson(batches):
+    """Yield one JSON object per row, with Yes/No flags as JSON booleans."""
+    columns = next(batches)
+    flags = [i for i, name in enumerate(columns) if name in flag_columns]
+    for batch in batches:
+        lines = []
+        for row in batch:
+            row = list(row)
+            for i in flags:
+                row[i] = row[i] == "Yes"
+            lines.append(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object collecting what pyarrow writes until take() is called."""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+class _ArrowEncoder:
+    """Turns row batches into record batches with one fixed schema.
+
+    The dictionaries start with the known category values; values met later
+    are appended, so every batch's dictionary extends the previous one (an
+    IPC stream then only carries dictionary deltas).
+    """
+
+    def __init__(self, pa, columns, categories):
+        self.pa = pa
+        self.columns = columns
+        self.dictionaries = {name: list(categories.get(name, ())) for name in category_columns}
+        self.codes = {name: {value: code for code, value in enumerate(values)}
+                      for name, values in self.dictionaries.items()}
+        self.schema = pa.schema([(name, self.column_type(name)) for name in columns])
+
+    def column_type(self, name):
+        pa = self.pa
+        if name in flag_columns:
+            return pa.bool_()
+        if name in category_columns:
+            return pa.dictionary(pa.int8(), pa.string())
+        if name in int16_columns:
+            return pa.int16()
+        if name in float_columns:
+            return pa.float64()
+        if name == "Box ID":
+            return pa.string()
+        return pa.int64()  # e.g. the "index" column of tables written by the old importer
+
+    def encode(self, name, values):
+        pa = self.pa
+        if name in flag_columns:
+            return pa.array([value == "Yes" for value in values], pa.bool_())
+        if name in category_columns:
+            dictionary, codes = self.dictionaries[name], self.codes[name]
+            indices = []
+            for value in values:
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(dictionary)
+                    dictionary.append(value)
+                indices.append(code)
+            return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int8()), pa.array(dictionary, pa.string()))
+        return pa.array(values, self.column_type(name))
+
+    def record_batch(self, rows):
+        values = list(zip(*rows)) if rows else [()] * len(self.columns)
+        arrays = [self.encode(name, column) for name, column in zip(self.columns, values)]
+        return self.pa.record_batch(arrays, schema=self.schema)
+
+
+def _rebatch(batches, rows=ARROW_BATCH_ROWS):
+    """Group small row batches into lists of about `rows` rows."""
+    pending = []
+    for batch in batches:
+        pending.extend(batch)
+        if len(pending) >= rows:
+            yield pending
+            pending = []
+    if pending:
+        yield pending
+
+
+def stream_arrow(batches, categories=None):
+    """Yield an Arrow IPC stream, one record batch per ARROW_BATCH_ROWS rows."""
+    import pyarrow as pa
+
+    encoder = _ArrowEncoder(pa, next(batches), categories or {})
+    sink = _ChunkSink()
+    options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    with pa.ipc.new_stream(sink, encoder.schema, options=options) as writer:
+        for rows in _rebatch(batches):
+            writer.write_batch(encoder.record_batch(rows))
+            yield sink.take()
+    yield sink.take()
+
+
+def stream_parquet(batches, categories=None):
+    """Yield a Parquet file, one row group per ARROW_BATCH_ROWS rows."""
+    import pyarrow.parquet as pq
+    import pyarrow as pa
+
+    encoder = _ArrowEncoder(pa, next(batches), categories or {})
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, encoder.schema) as writer:
+        for rows in _rebatch(batches):
+            writer.write_batch(encoder.record_batch(rows))
+            yield sink.take()
+    yield sink.take()
+
+
+def stream_zip(entries, compress=True):
+    """Yield a zip archive of (file name, byte chunks) entries while it is written.
+
+    The archive goes to a non-seekable sink, so zipfile writes sizes and CRCs
+    after each member's data and nothing is buffered beyond the current chunk.
+    Use compress=False for members that are already compressed (xlsx, Parquet).
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED) as archive:
+        for name, chunks in entries:
+            with archive.open(name, "w") as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    yield sink.take()
+            yield sink.take()
+    yield sink.take()
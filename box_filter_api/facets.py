@@ -0,0 +1,262 @@
+# facets.py
+"""
+Match counts, facet counts and histograms for the /facets endpoint.
+
+import_excel.py builds two aggregate tables after every import:
+
+- boxes_cube:      number of boxes per combination of Material, Color,
+                   Country of Origin and the four Yes/No flags (at most 5760 rows)
+- boxes_histogram: number of boxes per Material, flags, numeric column and
+                   bin (see histogram_widths)
+- boxes_range_histogram: for every numeric range column and bin of it, the
+                   facet counts and histograms of the boxes in that bin
+
+Filters on those categorical columns are answered from the aggregates alone,
+and so is a single numeric range whose bounds fall on bin edges (e.g.
+min_length=40). Other numeric ranges (and histograms filtered by Color or
+Country) need the rows: the in-memory engine is used when it is loaded,
+otherwise the matching rows are fetched from SQLite and counted with NumPy.
+"""
+import math
+from collections import Counter
+
+import numpy as np
+
+from memory_engine import equality_filters, range_columns, range_filters
+
+CUBE_TABLE = "boxes_cube"
+HISTOGRAM_TABLE = "boxes_histogram"
+RANGE_TABLE = "boxes_range_histogram"
+
+facet_columns = ["Material", "Color", "Country of Origin", "Fragile", "Stackable", "Waterproof", "Fire Retardant"]
+histogram_facets = ["Material", "Fragile", "Stackable", "Waterproof", "Fire Retardant"]
+# Bin width per numeric column: bin b holds values in [b * width, (b + 1) * width)
+histogram_widths = {
+    "Length (cm)": 10, "Width (cm)": 10, "Height (cm)": 10, "Thickness (cm)": 0.25,
+    "External Volume (L)": 100, "Max Load Capacity (kg)": 50,
+    "Min Temperature (°C)": 5, "Max Temperature (°C)": 10,
+}
+# Whole-number columns, where "<= v" covers whole bins when v + 1 falls on a bin edge
+integer_columns = {"Length (cm)", "Width (cm)", "Height (cm)", "Min Temperature (°C)", "Max Temperature (°C)"}
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _bins(values, width):
+    return np.floor(np.asarray(values, dtype=np.float64) / width).astype(np.int64)
+
+
+def build_aggregates(conn):
+    """(Re)build the cube and histogram tables from one pass over the boxes table.
+
+    Runs in the caller's transaction (see import_excel.publish), so the tables
+    change together with the boxes they count.
+    """
+    names = facet_columns + list(histogram_widths)
+    keys_index = [facet_columns.index(column) for column in histogram_facets]
+    cube = Counter()
+    histogram = Counter()
+    range_histogram = Counter()
+    cursor = conn.execute(f"SELECT {', '.join(_quote(name) for name in names)} FROM boxes")
+    while rows := cursor.fetchmany(50_000):
+        columns = list(zip(*rows))
+        cube.update(zip(*columns[:len(facet_columns)]))
+        keys = [columns[i] for i in keys_index]
+        bins = {column: _bins(values, histogram_widths[column])
+                for column, values in zip(histogram_widths, columns[len(facet_columns):])}
+        for column, column_bins in bins.items():
+            histogram.update(zip(*keys, [column] * len(rows), column_bins.tolist()))
+
+        # Every facet value and histogram bin, counted per bin of every range column
+        targets = {column: np.unique(np.asarray(values), return_inverse=True)
+                   for column, values in zip(facet_columns, columns)}
+        targets.update({column: np.unique(column_bins, return_inverse=True) for column, column_bins in bins.items()})
+        for range_column in range_columns:
+            low = int(bins[range_column].min())
+            offsets = bins[range_column] - low
+            for column, (values, codes) in targets.items():
+                # One bincount over (range bin, value code) pairs encoded as a single integer
+                counts = np.bincount(offsets * len(values) + codes.ravel())
+                present = np.flatnonzero(counts)
+                labels = values.tolist()
+                range_histogram.update({(range_column, low + pair // len(labels), column, labels[pair % len(labels)]): n
+                                        for pair, n in zip(present.tolist(), counts[present].tolist())})
+
+    facets = ", ".join(_quote(column) for column in facet_columns)
+    histogram_keys = ", ".join(_quote(column) for column in histogram_facets)
+    conn.execute(f"DROP TABLE IF EXISTS {CUBE_TABLE}")
+    conn.execute(f"DROP TABLE IF EXISTS {HISTOGRAM_TABLE}")
+    conn.execute(f"DROP TABLE IF EXISTS {RANGE_TABLE}")
+    conn.execute(f"CREATE TABLE {CUBE_TABLE} ({facets}, n INTEGER NOT NULL)")
+    conn.execute(f"CREATE TABLE {HISTOGRAM_TABLE} ({histogram_keys}, "
+                 f"column_name TEXT NOT NULL, bin INTEGER NOT NULL, n INTEGER NOT NULL)")
+    # value is a facet value (TEXT) or, for a histogram column, a bin (INTEGER)
+    conn.execute(f"CREATE TABLE {RANGE_TABLE} (range_column TEXT NOT NULL, range_bin INTEGER NOT NULL, "
+                 f"column_name TEXT NOT NULL, value NOT NULL, n INTEGER NOT NULL)")
+    conn.executemany(f"INSERT INTO {CUBE_TABLE} VALUES ({', '.join('?' * (len(facet_columns) + 1))})",
+                     (key + (n,) for key, n in cube.items()))
+    conn.executemany(f"INSERT INTO {HISTOGRAM_TABLE} VALUES ({', '.join('?' * (len(histogram_facets) + 3))})",
+                     (key + (n,) for key, n in histogram.items()))
+    conn.executemany(f"INSERT INTO {RANGE_TABLE} VALUES (?, ?, ?, ?, ?)",
+                     (key + (n,) for key, n in range_histogram.items()))
+
+
+def _equality_conditions(filters):
+    """{column: value} for the categorical filters that are set."""
+    return {column: filters[name] for name, column in equality_filters.items() if filters.get(name)}
+
+
+def _has_aggregates(conn, tables=(CUBE_TABLE, HISTOGRAM_TABLE)):
+    names = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return set(tables) <= names
+
+
+def _histogram_result(counts):
+    """{column: {bin: n}} -> response layout with bin bounds, in bin order."""
+    return {
+        column: {
+            "bin_width": histogram_widths[column],
+            "bins": [{"from": b * histogram_widths[column], "to": (b + 1) * histogram_widths[column], "count": n}
+                     for b, n in sorted(bins.items())],
+        }
+        for column, bins in counts.items()
+    }
+
+
+def _result(count, facets, histograms, source):
+    return {
+        "count": count,
+        "source": source,
+        "facets": {column: dict(sorted(facets.get(column, {}).items())) for column in facet_columns},
+        "histograms": _histogram_result({column: histograms.get(column, {}) for column in histogram_widths}),
+    }
+
+
+def cube_counts(conn, filters, row_histograms=True):
+    """Counts from the aggregate tables; None if the filters or the database do not allow it.
+
+    With Color or Country filters the histograms need the matching rows; they
+    are binned from SQLite if `row_histograms`, otherwise None is returned.
+    """
+    conditions = _equality_conditions(filters)
+    if any(filters.get(name) is not None for name in range_filters) or not _has_aggregates(conn):
+        return None  # numeric range filters, or a database imported before the aggregates existed
+    if not row_histograms and not set(conditions) <= set(histogram_facets):
+        return None
+    where = "".join(f" AND {_quote(column)} = ?" for column in conditions)
+    params = list(conditions.values())
+
+    facets = {}
+    for column in facet_columns:
+        facets[column] = dict(conn.execute(
+            f"SELECT {_quote(column)}, SUM(n) FROM {CUBE_TABLE} WHERE 1=1{where} GROUP BY 1", params))
+    count = sum(facets[facet_columns[0]].values())
+
+    histograms = {column: {} for column in histogram_widths}
+    if set(conditions) <= set(histogram_facets):
+        rows = conn.execute(f"SELECT column_name, bin, SUM(n) FROM {HISTOGRAM_TABLE} WHERE 1=1{where} GROUP BY 1, 2",
+                            params)
+        for column, b, n in rows:
+            histograms[column][b] = n
+    else:
+        # Color / Country are not histogram dimensions: bin the matching rows
+        histograms = sql_row_counts(conn, " WHERE 1=1" + where, params)[2]
+    return _result(count, facets, histograms, "cube")
+
+
+def _range_bins(filters):
+    """(column, first bin, last bin) when the filters are one numeric range on bin edges, else None.
+
+    A missing bound gives None for that bin.
+    """
+    bounds = {}
+    for name, (column, op) in range_filters.items():
+        if filters.get(name) is not None:
+            bounds.setdefault(column, {})[op] = filters[name]
+    if len(bounds) != 1:
+        return None
+    (column, ops), = bounds.items()
+    width = histogram_widths[column]
+    first = last = None
+    if ">=" in ops:
+        first = ops[">="] / width
+        if first != math.floor(first):
+            return None
+    if "<=" in ops:
+        if column not in integer_columns:
+            return None
+        last = (math.floor(ops["<="]) + 1) / width - 1
+        if last != math.floor(last):
+            return None
+    return column, *(None if b is None else int(b) for b in (first, last))
+
+
+def range_counts(conn, filters):
+    """Counts from boxes_range_histogram; None unless the only filter is a bin-aligned numeric range."""
+    if _equality_conditions(filters) or not _has_aggregates(conn, (RANGE_TABLE,)):
+        return None
+    bins = _range_bins(filters)
+    if bins is None:
+        return None
+    column, first, last = bins
+    where = " AND range_bin >= ?" * (first is not None) + " AND range_bin <= ?" * (last is not None)
+    params = [column] + [b for b in (first, last) if b is not None]
+    facets = {column: {} for column in facet_columns}
+    histograms = {column: {} for column in histogram_widths}
+    rows = conn.execute(f"SELECT column_name, value, SUM(n) FROM {RANGE_TABLE} "
+                        f"WHERE range_column = ?{where} GROUP BY 1, 2", params)
+    for name, value, n in rows:
+        (facets if name in facets else histograms)[name][value] = n
+    count = sum(facets[facet_columns[0]].values())
+    return _result(count, facets, histograms, "cube")
+
+
+def sql_row_counts(conn, where, params):
+    """(count, facets, histograms) counted over the matching rows in SQLite."""
+    names = facet_columns + list(histogram_widths)
+    facets = {column: Counter() for column in facet_columns}
+    histograms = {column: Counter() for column in histogram_widths}
+    count = 0
+    cursor = conn.execute(f"SELECT {', '.join(_quote(name) for name in names)} FROM boxes{where}", params)
+    while rows := cursor.fetchmany(50_000):
+        count += len(rows)
+        for i, values in enumerate(zip(*rows)):
+            name = names[i]
+            if name in facets:
+                facets[name].update(values)
+            else:
+                bins, counts = np.unique(_bins(values, histogram_widths[name]), return_counts=True)
+                histograms[name].update(dict(zip(bins.tolist(), counts.tolist())))
+    return count, facets, histograms
+
+
+def engine_counts(engine, filters):
+    """Counts over the rows selected by the in-memory engine."""
+    positions = engine.positions(filters)
+    facets = {}
+    for column in facet_columns:
+        facets[column] = {}
+        for value, bitmap in engine.bitmaps[column].items():
+            n = int(engine.bit_test(bitmap, positions).sum())
+            if n:
+                facets[column][value] = n
+    histograms = {}
+    for column, width in histogram_widths.items():
+        bins, counts = np.unique(np.floor(engine.values[column][positions] / width).astype(np.int64),
+                                 return_counts=True)
+        histograms[column] = dict(zip(bins.tolist(), counts.tolist()))
+    return _result(len(positions), facets, histograms, "memory")
+
+
+def facet_counts(conn, filters, where, params, engine=None):
+    """Match count, facet counts and histograms for the build_where() keyword `filters`."""
+    result = cube_counts(conn, filters, row_histograms=engine is None)
+    if result is None:
+        result = range_counts(conn, filters)
+    if result is not None:
+        return result
+    if engine is not None:
+        return engine_counts(engine, filters)
+    return _result(*sql_row_counts(conn, where, params), "rows")
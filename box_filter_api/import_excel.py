@@ -1,30 +1,254 @@
 # import_excel.py
+"""
+Bulk-load box datasets into the SQLite database used by the API (packages.db).
 
-import pandas as pd
-import sqlite3
+🔧 Usage:
+   python import_excel.py boxes_10000.xlsx                       # replace the table
+   python import_excel.py new_boxes.csv --mode append            # add rows, keep existing Box IDs
+   python import_excel.py fixes.parquet --mode upsert            # add rows, overwrite existing Box IDs
+   python import_excel.py a.xlsx b.boxcol --db /data/packages.db
+
+Append mode skips rows whose Box ID is already in the table. Generated datasets
+number their Box IDs from BX000000, so generate boxes meant for appending with
+`box_generator.py --start-id N` (e.g. N = the current row count) to give them new IDs.
+
+The `boxes` table has typed columns, "Box ID" as primary key and an index for
+every filter of main.py. Rows are inserted in large transactions with WAL
+journaling. The count aggregates behind /facets (see facets.py) and the
+per-value rowid lists for stratified sampling (see strata.py) are rebuilt
+after every import, in the same transaction as its last step.
+
+A replace loads into the staging table `boxes_new`. The old table is swapped
+out in one transaction that also builds the indexes, aggregates and strata
+and bumps the database version, so the API serves the previous boxes
+until the new ones are complete.
+"""
+import argparse
 import os
+import sqlite3
+import sys
+import time
+
+# Shared dataset loader and statistics (repository root)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from box_dataset import columns, columns_to_frame, frame_to_columns, open_boxes, read_frame
+from box_stats import DatasetSummary, write_summary_sidecar
+from facets import build_aggregates
+from strata import build_strata
+
+DB_NAME = "packages.db"
+TABLE_NAME = "boxes"
+STAGING_TABLE = "boxes_new"  # replace imports are loaded here, then renamed to TABLE_NAME
+BATCH_ROWS = 50_000
+
+# SQL type of every dataset column
+column_types = {
+    "Box ID": "TEXT NOT NULL PRIMARY KEY",
+    "Length (cm)": "INTEGER NOT NULL",
+    "Width (cm)": "INTEGER NOT NULL",
+    "Height (cm)": "INTEGER NOT NULL",
+    "Thickness (cm)": "REAL NOT NULL",
+    "External Volume (L)": "REAL NOT NULL",
+    "Internal Volume (L)": "REAL NOT NULL",
+    "Max Load Capacity (kg)": "REAL NOT NULL",
+    "Material": "TEXT NOT NULL",
+    "Fragile": "TEXT NOT NULL CHECK (Fragile IN ('Yes', 'No'))",
+    "Stackable": "TEXT NOT NULL CHECK (Stackable IN ('Yes', 'No'))",
+    "Waterproof": "TEXT NOT NULL CHECK (Waterproof IN ('Yes', 'No'))",
+    "Fire Retardant": "TEXT NOT NULL CHECK (`Fire Retardant` IN ('Yes', 'No'))",
+    "Min Temperature (°C)": "INTEGER NOT NULL",
+    "Max Temperature (°C)": "INTEGER NOT NULL",
+    "Color": "TEXT NOT NULL",
+    "Country of Origin": "TEXT NOT NULL",
+}
+
+# One index per filter column of main.py's run_query
+index_columns = [
+    "Length (cm)", "Width (cm)", "Height (cm)", "Thickness (cm)",
+    "External Volume (L)", "Max Load Capacity (kg)",
+    "Min Temperature (°C)", "Max Temperature (°C)",
+    "Material", "Fragile", "Stackable", "Waterproof", "Fire Retardant",
+    "Color", "Country of Origin",
+]
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def index_name(column):
+    return "idx_boxes_" + "".join(c if c.isalnum() else "_" for c in column.lower()).strip("_")
+
+
+def connect(db_name):
+    conn = sqlite3.connect(db_name)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")  # 256 MiB
+    return conn
+
+
+def has_typed_schema(conn):
+    """True when the boxes table exists with "Box ID" as its primary key."""
+    info = conn.execute(f"PRAGMA table_info({TABLE_NAME})").fetchall()
+    return any(name == "Box ID" and pk for _, name, _, _, _, pk in info)
+
+
+def create_table(conn, table=TABLE_NAME):
+    definitions = ",\n    ".join(f"{quote(name)} {column_types[name]}" for name in columns)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (\n    {definitions}\n)")
+
+
+def create_indexes(conn):
+    for column in index_columns:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name(column)} ON {TABLE_NAME} ({quote(column)})")
+    conn.execute("ANALYZE")
+
+
+def bump_version(conn):
+    """Increment PRAGMA user_version within the open transaction.
+
+    The API drops its cached filter results (and reloads the in-memory engine)
+    when the version changes, so every transaction that changes the boxes
+    table bumps it before committing: a reader never sees new rows under an
+    old version.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.execute(f"PRAGMA user_version = {version + 1}")
+
+
+def prepare_table(conn, mode):
+    """Create, migrate or stage the table an import in `mode` writes to, and return its name.
+
+    A replace gets an empty staging table (see publish()); the other modes
+    write to the live boxes table.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE_NAME,)
+    ).fetchone()
+    with conn:
+        # sqlite3 only opens transactions implicitly before INSERT/UPDATE/DELETE; the DDL below must be atomic too
+        conn.execute("BEGIN")
+        if mode == "replace":
+            conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")  # left over by an interrupted replace
+            create_table(conn, STAGING_TABLE)  # indexes are built when it is swapped in
+            return STAGING_TABLE
+        elif not exists:
+            create_table(conn)
+            create_indexes(conn)
+        elif not has_typed_schema(conn):
+            # Table written by an older importer (pandas to_sql): migrate it to the typed schema
+            print(f"🔁 Migrating '{TABLE_NAME}' to the typed schema")
+            conn.execute(f"ALTER TABLE {TABLE_NAME} RENAME TO {TABLE_NAME}_legacy")
+            create_table(conn)
+            names = ", ".join(quote(name) for name in columns)
+            conn.execute(f"INSERT OR REPLACE INTO {TABLE_NAME} ({names}) SELECT {names} FROM {TABLE_NAME}_legacy")
+            conn.execute(f"DROP TABLE {TABLE_NAME}_legacy")
+            create_indexes(conn)
+            bump_version(conn)
+    return TABLE_NAME
+
+
+def publish(conn, mode):
+    """Finish an import in one transaction: indexes, aggregates, strata and version.
+
+    For a replace the staging table takes the place of the boxes table, whose
+    indexes are dropped with it, so the new indexes keep their usual names.
+    Readers see the previous table until the commit.
+    """
+    with conn:
+        conn.execute("BEGIN")
+        if mode == "replace":
+            conn.execute(f"DROP TABLE IF EXISTS {TABLE_NAME}")
+            conn.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO {TABLE_NAME}")
+            create_indexes(conn)
+            bump_version(conn)
+        else:
+            conn.execute("ANALYZE")
+        build_aggregates(conn)
+        build_strata(conn)
+
+
+def insert_statement(mode, table=TABLE_NAME):
+    names = ", ".join(quote(name) for name in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    if mode == "append":
+        # Rows whose Box ID is already present are skipped
+        return f"INSERT OR IGNORE INTO {table} ({names}) VALUES ({placeholders})"
+    if mode == "upsert":
+        updates = ", ".join(f"{quote(name)} = excluded.{quote(name)}" for name in columns[1:])
+        return (f"INSERT INTO {table} ({names}) VALUES ({placeholders}) "
+                f'ON CONFLICT("Box ID") DO UPDATE SET {updates}')
+    return f"INSERT INTO {table} ({names}) VALUES ({placeholders})"
+
+
+def iter_batches(dataset_file, batch_rows=BATCH_ROWS):
+    """Yield (columnar chunk, dictionaries) pairs of at most `batch_rows` rows."""
+    dataset = open_boxes(dataset_file)
+    if dataset is not None:
+        for start in range(0, len(dataset), batch_rows):
+            yield dataset.columns(start, start + batch_rows), dataset.dictionaries
+        return
+    boxes, dictionaries = frame_to_columns(read_frame(dataset_file))
+    for start in range(0, len(boxes["box_index"]), batch_rows):
+        yield {key: column[start:start + batch_rows] for key, column in boxes.items()}, dictionaries
+
+
+def import_dataset(conn, dataset_file, mode, batch_rows=BATCH_ROWS, table=TABLE_NAME):
+    """Insert every row of one dataset, one transaction per batch; returns the rows inserted or updated."""
+    statement = insert_statement(mode, table)
+    summary = DatasetSummary()
+    changed = 0
+    for chunk, dictionaries in iter_batches(dataset_file, batch_rows):
+        frame = columns_to_frame(chunk, dictionaries)
+        rows = zip(*(frame[name].tolist() for name in columns))
+        before = conn.total_changes
+        with conn:
+            conn.executemany(statement, rows)
+            if table == TABLE_NAME:
+                bump_version(conn)  # the staging table is invisible to the API
+        changed += conn.total_changes - before
+        summary.update(chunk, dictionaries)
 
-# Prompt the user for the Excel file name
-excel_file = input("Enter the Excel file name (e.g., boxes_10000.xlsx): ")
+    # Write the summary sidecar (statistics and zone maps) next to the dataset
+    try:
+        write_summary_sidecar(dataset_file, summary)
+    except OSError as error:
+        print(f"⚠️ No summary sidecar written: {error}")
+    return summary.stats.rows, changed
 
-# Check if file exists
-if not os.path.exists(excel_file):
-    print(f"❌ File '{excel_file}' not found.")
-    exit(1)
 
-# Load the Excel file
-df = pd.read_excel(excel_file)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load box datasets into the API's SQLite database.")
+    parser.add_argument("datasets", nargs="+",
+                        help="dataset files (.xlsx, .csv, .parquet, .ndjson or .boxcol), loaded in order")
+    parser.add_argument("--db", default=DB_NAME, help=f"SQLite database file (default: {DB_NAME})")
+    parser.add_argument("--mode", choices=["replace", "append", "upsert"], default="replace",
+                        help="replace the table, append rows with new Box IDs only, "
+                             "or upsert (insert or overwrite by Box ID)")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="rows per transaction")
+    args = parser.parse_args()
 
-# Define the database and table names
-db_name = "packages.db"
-table_name = "boxes"
+    for dataset_file in args.datasets:
+        if not os.path.exists(dataset_file):
+            print(f"❌ File '{dataset_file}' not found.")
+            sys.exit(1)
 
-# Connect to SQLite database (or create it if it doesn't exist)
-conn = sqlite3.connect(db_name)
+    start_time = time.time()
+    conn = connect(args.db)
+    table = prepare_table(conn, args.mode)
 
-# Write the dataframe to the SQLite table
-df.to_sql(table_name, conn, if_exists="replace", index=False)
+    for i, dataset_file in enumerate(args.datasets):
+        # After the first file of a replace, the remaining files are appended
+        mode = args.mode if args.mode != "replace" or i == 0 else "upsert"
+        rows, changed = import_dataset(conn, dataset_file, mode, args.batch_rows, table)
+        skipped = f", {rows - changed} existing Box IDs skipped" if mode == "append" else ""
+        print(f"✅ '{dataset_file}': {rows} rows read, {changed} inserted or updated{skipped}")
 
-conn.close()
+    publish(conn, args.mode)
+    total = conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0]
+    conn.close()
 
-print(f"✅ Excel data from '{excel_file}' imported into '{db_name}' (table: '{table_name}')!")
+    print(f"✅ '{args.db}' (table: '{TABLE_NAME}') now holds {total} boxes "
+          f"({time.time() - start_time:.2f} s)")
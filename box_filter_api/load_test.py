@@ -0,0 +1,88 @@
+# load_test.py
+"""
+Local load test for the filter API: many concurrent clients, latency percentiles and throughput.
+
+🔧 Usage (with the server running, e.g. `uvicorn main:app`):
+   python load_test.py                                   # 32 clients, 2000 requests, mixed picking lists
+   python load_test.py --concurrency 64 --requests 5000
+   python load_test.py --path "/download/csv?material=Wood&limit=100" --path "/download/excel?limit=50"
+
+Each client thread sends its requests back to back and reads the whole
+response. 503 answers (server busy) are counted separately from errors.
+"""
+import argparse
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PATHS = [
+    "/download/csv?limit=100",
+    "/download/csv?material=Cardboard&stackable=Yes&min_length=40&limit=100",
+    "/download/csv?fragile=No&country=Germany&limit=50&sample_with_replacement=true",
+    "/download/ndjson?material=Wood&limit=100",
+]
+
+
+def fetch(url, timeout):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            size = len(response.read())
+            status = response.status
+    except urllib.error.HTTPError as error:
+        size, status = 0, error.code
+    except OSError:
+        size, status = 0, "error"
+    return time.perf_counter() - start, status, size
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+def run(base_url, paths, concurrency, requests, timeout):
+    counter = iter(range(requests))
+    lock = threading.Lock()
+    results = []
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            result = fetch(base_url + paths[i % len(paths)], timeout)
+            with lock:
+                results.append(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        for _ in range(concurrency):
+            clients.submit(client)
+    return time.perf_counter() - start, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the box filter API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="server base URL")
+    parser.add_argument("--path", action="append", help="request path (repeatable); default: a mix of picking lists")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000, help="total requests")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds per request")
+    args = parser.parse_args()
+
+    elapsed, results = run(args.url.rstrip("/"), args.path or DEFAULT_PATHS, args.concurrency, args.requests, args.timeout)
+    statuses = Counter(status for _, status, _ in results)
+    ok = [seconds * 1000 for seconds, status, _ in results if status == 200]
+
+    print(f"🚀 {len(results)} requests, {args.concurrency} clients, {elapsed:.2f} s")
+    print(f"   throughput: {len(ok) / elapsed:.1f} successful requests/s "
+          f"({sum(size for _, _, size in results) / elapsed / 1e6:.2f} MB/s)")
+    if ok:
+        print(f"   latency (ms): p50 {percentile(ok, 50):.1f}  p90 {percentile(ok, 90):.1f}  "
+              f"p99 {percentile(ok, 99):.1f}  max {max(ok):.1f}")
+    print(f"   status codes: {dict(statuses)}")
@@ -1,20 +1,106 @@
-from fastapi import FastAPI, Query
-from fastapi.responses import StreamingResponse
-from typing import Optional, Literal
-import sqlite3
-import pandas as pd
-from io import BytesIO, StringIO
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import List, Optional, Literal, get_args
+import asyncio
+import contextvars
+import csv
+import inspect
+import os
+import threading
+import weakref
+from io import StringIO
+from tempfile import SpooledTemporaryFile
 import random
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 
-app = FastAPI()
+import exports
+import facets
+import metrics
+from db_pool import ConnectionPool, PoolExhausted
+from memory_engine import EngineLoader, equality_filters
+from metrics import TimingMiddleware, count, phase
+from result_cache import ResultCache, cache_key
+from shared_scan import scan_rowids
+from strata import stratum_rowids, stratum_size
+
+@asynccontextmanager
+async def lifespan(app):
+    if engine_loader is not None:
+        engine_loader.start()  # requests use SQLite until the engine is loaded
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(TimingMiddleware)
+result_cache = ResultCache()
+
+
+@app.exception_handler(PoolExhausted)
+async def pool_exhausted(request, error):
+    return JSONResponse(status_code=503, content={"detail": "All database connections are busy, retry shortly"},
+                        headers={"Retry-After": "1"})
 
 # Define enums for dropdowns
 MaterialEnum = Literal["Cardboard", "Plastic", "Wood", "Metal", "Composite"]
 ColorEnum = Literal["White", "Gray", "Brown", "Light Brown", "Deep Brown", "Yellow", "Light Yellow", "Dark Yellow"]
 CountryEnum = Literal["Greece", "Germany", "China", "USA", "India", "Mexico", "Japan", "Australia", "France"]
 YesNoEnum = Literal["Yes", "No"]
+StratifyEnum = Literal["material", "fragile", "stackable", "waterproof", "fire_retardant", "color", "country"]
 
-def run_query(
+# Initial dictionaries of the categorical columns in the Parquet and Arrow downloads
+categories = {
+    "Material": get_args(MaterialEnum),
+    "Color": get_args(ColorEnum),
+    "Country of Origin": get_args(CountryEnum),
+}
+
+DB_NAME = "packages.db"
+FETCH_BATCH = 500  # rowids per "rowid IN (...)" lookup, below SQLite's bound-parameter limit
+XLSX_SPOOL = 16 * 1024 * 1024  # Excel exports larger than this are spooled to a temporary file
+XLSX_CHUNK = 256 * 1024
+
+# Concurrency: queries and serialization run on WORKERS threads, at most MAX_IN_FLIGHT downloads
+# are open at once, and a request waiting more than QUEUE_WAIT seconds for a slot gets 503
+WORKERS = int(os.environ.get("API_WORKERS", min(8, os.cpu_count() or 1)))
+MAX_IN_FLIGHT = int(os.environ.get("API_MAX_IN_FLIGHT", 32))
+QUEUE_WAIT = float(os.environ.get("API_QUEUE_WAIT", 2.0))
+# Connections beyond MAX_IN_FLIGHT for work that holds no download slot: /facets runs on at most
+# WORKERS threads at once, plus one for the memory engine loader
+POOL_RESERVE = int(os.environ.get("API_POOL_RESERVE", WORKERS + 1))
+# Batch downloads: at most BATCH_MAX_LISTS picking lists and BATCH_MAX_ROWS boxes per request; from
+# SHARED_SCAN_MIN uncached filter combinations on, one table scan is cheaper than one query each
+BATCH_MAX_LISTS = int(os.environ.get("API_BATCH_MAX_LISTS", 1000))
+BATCH_MAX_ROWS = int(os.environ.get("API_BATCH_MAX_ROWS", 1_000_000))
+SHARED_SCAN_MIN = 12
+executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="box-api")
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The read-only connection pool for DB_NAME: one connection per possible in-flight download plus POOL_RESERVE.
+
+    A caller that finds no free connection within QUEUE_WAIT seconds gets 503 (PoolExhausted).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.db_name != DB_NAME:
+            _pool = ConnectionPool(DB_NAME, MAX_IN_FLIGHT + POOL_RESERVE, timeout=QUEUE_WAIT)
+        return _pool
+
+
+# Optional in-memory filter engine (memory_engine.py), rebuilt when an import changes the database
+MEMORY_ENGINE = os.environ.get("API_MEMORY_ENGINE", "0") == "1"
+engine_loader = EngineLoader(lambda: get_pool().connection()) if MEMORY_ENGINE else None
+
+
+def build_where(
     min_length=None, max_length=None,
     min_width=None, max_width=None,
     min_height=None, max_height=None,
@@ -25,32 +111,29 @@ def run_query(
     material=None, fragile=None,
     stackable=None, waterproof=None, fire_retardant=None,
     color=None, country=None,
-    limit=None
 ):
-    conn = sqlite3.connect("packages.db")
-    cursor = conn.cursor()
-
-    query = "SELECT * FROM boxes WHERE 1=1"
+    """WHERE clause and parameters for the given filters (None means no filter)."""
+    query = " WHERE 1=1"
     params = []
 
     # Dimension filters
-    if min_length: query += " AND `Length (cm)` >= ?"; params.append(min_length)
-    if max_length: query += " AND `Length (cm)` <= ?"; params.append(max_length)
-    if min_width: query += " AND `Width (cm)` >= ?"; params.append(min_width)
-    if max_width: query += " AND `Width (cm)` <= ?"; params.append(max_width)
-    if min_height: query += " AND `Height (cm)` >= ?"; params.append(min_height)
-    if max_height: query += " AND `Height (cm)` <= ?"; params.append(max_height)
-    if min_thickness: query += " AND `Thickness (cm)` >= ?"; params.append(min_thickness)
-    if max_thickness: query += " AND `Thickness (cm)` <= ?"; params.append(max_thickness)
+    if min_length is not None: query += " AND `Length (cm)` >= ?"; params.append(min_length)
+    if max_length is not None: query += " AND `Length (cm)` <= ?"; params.append(max_length)
+    if min_width is not None: query += " AND `Width (cm)` >= ?"; params.append(min_width)
+    if max_width is not None: query += " AND `Width (cm)` <= ?"; params.append(max_width)
+    if min_height is not None: query += " AND `Height (cm)` >= ?"; params.append(min_height)
+    if max_height is not None: query += " AND `Height (cm)` <= ?"; params.append(max_height)
+    if min_thickness is not None: query += " AND `Thickness (cm)` >= ?"; params.append(min_thickness)
+    if max_thickness is not None: query += " AND `Thickness (cm)` <= ?"; params.append(max_thickness)
 
     # Volume & weight
-    if min_volume: query += " AND `External Volume (L)` >= ?"; params.append(min_volume)
-    if max_volume: query += " AND `External Volume (L)` <= ?"; params.append(max_volume)
-    if min_load_capacity: query += " AND `Max Load Capacity (kg)` >= ?"; params.append(min_load_capacity)
+    if min_volume is not None: query += " AND `External Volume (L)` >= ?"; params.append(min_volume)
+    if max_volume is not None: query += " AND `External Volume (L)` <= ?"; params.append(max_volume)
+    if min_load_capacity is not None: query += " AND `Max Load Capacity (kg)` >= ?"; params.append(min_load_capacity)
 
     # Temperature
-    if min_temp: query += " AND `Min Temperature (°C)` >= ?"; params.append(min_temp)
-    if max_temp: query += " AND `Max Temperature (°C)` <= ?"; params.append(max_temp)
+    if min_temp is not None: query += " AND `Min Temperature (°C)` >= ?"; params.append(min_temp)
+    if max_temp is not None: query += " AND `Max Temperature (°C)` <= ?"; params.append(max_temp)
 
     # Material & Attributes
     if material: query += " AND Material = ?"; params.append(material)
@@ -63,42 +146,237 @@ def run_query(
     if color: query += " AND Color = ?"; params.append(color)
     if country: query += " AND `Country of Origin` = ?"; params.append(country)
 
-    # Randomization
-    query += " ORDER BY RANDOM()"
-    # No LIMIT here – handled in Python when needed
-    cursor.execute(query, params)
-    columns = [desc[0] for desc in cursor.description]
-    results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-    conn.close()
-    return results
+    return query, params
 
 
-@app.get("/download/csv")
-def download_csv(
-    min_length: Optional[float] = Query(None, ge=20, le=100),
-    max_length: Optional[float] = Query(None, ge=20, le=100),
-    min_width: Optional[float] = Query(None, ge=5, le=99),
-    max_width: Optional[float] = Query(None, ge=5, le=99),
-    min_height: Optional[float] = Query(None, ge=5, le=95),
-    max_height: Optional[float] = Query(None, ge=5, le=95),
-    min_thickness: Optional[float] = Query(None),
-    max_thickness: Optional[float] = Query(None),
-    min_volume: Optional[float] = Query(None),
-    max_volume: Optional[float] = Query(None),
-    min_load_capacity: Optional[float] = Query(None),
-    min_temp: Optional[int] = Query(None, ge=-45, le=120),
-    max_temp: Optional[int] = Query(None, ge=-45, le=120),
-    material: Optional[MaterialEnum] = Query(None),
-    fragile: Optional[YesNoEnum] = Query(None),
-    stackable: Optional[YesNoEnum] = Query(None),
-    waterproof: Optional[YesNoEnum] = Query(None),
-    fire_retardant: Optional[YesNoEnum] = Query(None),
-    color: Optional[ColorEnum] = Query(None),
-    country: Optional[CountryEnum] = Query(None),
-    limit: Optional[int] = Query(100),
-    sample_with_replacement: Optional[bool] = Query(False, description="Allow duplicate boxes (sample with replacement)")
+def existing_rowids(cursor, rowids):
+    """The subset of `rowids` present in the boxes table."""
+    found = set()
+    for start in range(0, len(rowids), FETCH_BATCH):
+        batch = rowids[start:start + FETCH_BATCH]
+        cursor.execute(f"SELECT rowid FROM boxes WHERE rowid IN ({', '.join('?' * len(batch))})", batch)
+        found.update(rowid for rowid, in cursor)
+    return found
+
+
+def sample_rowid_range(cursor, limit, sample_with_replacement=False, rounds=4, rng=random):
+    """Rejection-sample `limit` rowids of the whole table from its rowid range.
+
+    Draws are uniform over [MIN(rowid), MAX(rowid)] and draws that hit a gap
+    (deleted rows) are redrawn, which keeps the sample uniform over the rows.
+    Returns None when the range is too sparse or too small for this to pay off.
+    """
+    # Two subqueries: each is a single b-tree seek, while MIN and MAX together would scan the table
+    low, high = cursor.execute("SELECT (SELECT MIN(rowid) FROM boxes), (SELECT MAX(rowid) FROM boxes)").fetchone()
+    if low is None:
+        return []
+    span = range(low, high + 1)
+    if not sample_with_replacement and limit >= len(span):
+        return None
+    sampled, seen = [], set()
+    for _ in range(rounds):
+        need = limit - len(sampled)
+        if sample_with_replacement:
+            draws = rng.choices(span, k=need)
+        else:
+            draws = [r for r in rng.sample(span, min(len(span), need + len(seen))) if r not in seen][:need]
+            seen.update(draws)
+        found = existing_rowids(cursor, list(set(draws)))
+        count("rows_scanned", len(draws))
+        sampled.extend(r for r in draws if r in found)
+        if len(sampled) == limit:
+            return sampled
+    return None
+
+
+def candidate_rowids(cursor, filters, known=None):
+    """Rowids matching `filters` (build_where keywords).
+
+    They come from `known` ({cache_key: rowids} looked up in advance, see
+    batch_candidates), from the in-memory engine when it is enabled and loaded for the
+    current database version, otherwise from the result cache when the same
+    filters were seen recently, otherwise from SQLite. Either way they are
+    in rowid order, so a seeded sample does not depend on where they came from.
+    """
+    if known:
+        rowids = known.get(cache_key(*build_where(**filters)))
+        if rowids is not None:
+            return rowids
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if engine_loader is not None:
+        engine = engine_loader.get(version)
+        if engine is not None:
+            return engine.select(filters)
+    result_cache.validate(version)
+    where, params = build_where(**filters)
+    key = cache_key(where, params)
+    rowids = result_cache.get(key)
+    if rowids is None:
+        rowids = result_cache.put(key, sorted(rowid for rowid, in cursor.execute("SELECT rowid FROM boxes" + where, params)))
+    return rowids
+
+
+def sample_rowids(cursor, filters, limit=None, sample_with_replacement=False, rng=random, known=None):
+    """Random sample of the rowids matching `filters`, in sample order.
+
+    Without filters the sample is drawn from the rowid range directly, so the
+    cost only depends on `limit`. Otherwise only the matching rowids are read
+    (through the filter indexes, the result cache or the in-memory engine)
+    and sampled in Python; no rows are sorted or copied. limit=None returns every match in
+    random order.
+    """
+    with phase("select"):
+        if not build_where(**filters)[1] and limit is not None:
+            sampled = sample_rowid_range(cursor, limit, sample_with_replacement, rng=rng)
+            if sampled is not None:
+                return sampled
+
+        candidates = candidate_rowids(cursor, filters, known)
+        count("rows_scanned", len(candidates))
+        if not candidates:
+            return []
+        if sample_with_replacement and limit is not None:
+            return rng.choices(candidates, k=limit)
+        k = len(candidates) if limit is None else min(limit, len(candidates))
+        return rng.sample(candidates, k)
+
+
+def stratified_rowids(cursor, filters, strata, sample_with_replacement=False, rng=random, known=None):
+    """Rowids of a sample with `quotas[value]` boxes per value of one categorical filter, shuffled.
+
+    `strata` is (build_where keyword, {value: quota}). Without other filters
+    each stratum is drawn from its rowid list in boxes_strata, so the cost
+    only depends on the quotas. With other filters, or a database imported
+    before boxes_strata existed, every stratum is sampled like a filter
+    combination of its own. A stratum smaller than its quota is returned whole
+    unless sampling with replacement.
+    """
+    name, quotas = strata
+    column = equality_filters[name]
+    filtered = bool(build_where(**filters)[1])
+    sampled = []
+    with phase("select"):
+        for value, quota in quotas.items():
+            size = None if filtered else stratum_size(cursor, column, value)
+            if size is None:
+                sampled += sample_rowids(cursor, {**filters, name: value}, quota, sample_with_replacement, rng, known)
+            elif size:
+                positions = (rng.choices(range(size), k=quota) if sample_with_replacement
+                             else rng.sample(range(size), min(quota, size)))
+                sampled += stratum_rowids(cursor, column, value, positions)
+                count("rows_scanned", len(positions))
+        rng.shuffle(sampled)
+    return sampled
+
+
+def table_columns(cursor):
+    cursor.execute("SELECT * FROM boxes LIMIT 0")
+    return [desc[0] for desc in cursor.description]
+
+
+def rows_by_rowid(cursor, rowids):
+    """{rowid: row} for those of `rowids` still in the boxes table, FETCH_BATCH rowids per query."""
+    rows = {}
+    for start in range(0, len(rowids), FETCH_BATCH):
+        batch = rowids[start:start + FETCH_BATCH]
+        cursor.execute(f"SELECT rowid, * FROM boxes WHERE rowid IN ({', '.join('?' * len(batch))})", batch)
+        rows.update((row[0], row[1:]) for row in cursor)
+    return rows
+
+
+def drop_cached(filter_sets):
+    """Forget the cached rowids of these filter combinations (build_where keywords)."""
+    for filters in filter_sets:
+        result_cache.discard(cache_key(*build_where(**filters)))
+
+
+def fetch_rows(cursor, rowids, resample=None):
+    """Yield the rows for `rowids` in the given order (repeated rowids are repeated), FETCH_BATCH at a time.
+
+    A rowid is gone when an import changed the table after it was sampled.
+    `resample()` is then called once for a fresh sample of the same request,
+    which provides the rest of the rows; rowids still missing are skipped.
+    """
+    start = 0
+    while start < len(rowids):
+        batch = rowids[start:start + FETCH_BATCH]
+        with phase("fetch"):
+            by_rowid = rows_by_rowid(cursor, list(dict.fromkeys(batch)))
+        if resample is not None and any(rowid not in by_rowid for rowid in batch):
+            rowids, resample = resample(), None
+            continue
+        rows = [by_rowid[rowid] for rowid in batch if rowid in by_rowid]
+        count("rows_returned", len(rows))
+        yield rows
+        start += FETCH_BATCH
+
+
+def iter_batches(cursor, filters, limit=None, sample_with_replacement=False, shuffle=True, rng=random, strata=None):
+    """Yield the column names, then lists of at most FETCH_BATCH sampled rows.
+
+    limit=None yields every match: shuffled in memory if `shuffle`, otherwise
+    streamed from the cursor in table order so memory does not grow with the
+    result size. With `strata` (see stratified_rowids) the quotas replace the limit.
+    """
+    if strata is None and limit is None:
+        where, params = build_where(**filters)
+        with phase("fetch"):
+            cursor.execute("SELECT * FROM boxes" + where, params)
+        yield [desc[0] for desc in cursor.description]
+        if shuffle:
+            # Read the matches in table order and shuffle in Python (no sort)
+            with phase("fetch"):
+                rows = cursor.fetchall()
+                rng.shuffle(rows)
+            count("rows_scanned", len(rows))
+            count("rows_returned", len(rows))
+            for start in range(0, len(rows), FETCH_BATCH):
+                yield rows[start:start + FETCH_BATCH]
+        else:
+            while True:
+                with phase("fetch"):
+                    batch = cursor.fetchmany(FETCH_BATCH)
+                if not batch:
+                    break
+                count("rows_scanned", len(batch))
+                count("rows_returned", len(batch))
+                yield batch
+        return
+
+    # Randomization: sample rowids, then fetch only the sampled rows
+    if strata is not None:
+        filter_sets = [{**filters, strata[0]: value} for value in strata[1]]
+        select = partial(stratified_rowids, cursor, filters, strata, sample_with_replacement, rng)
+    else:
+        filter_sets = [filters]
+        select = partial(sample_rowids, cursor, filters, limit, sample_with_replacement, rng)
+
+    def resample():
+        # The rowids came from before an import: look the filters up again
+        drop_cached(filter_sets)
+        return select()
+
+    rowids = select()
+    yield table_columns(cursor)
+    yield from fetch_rows(cursor, rowids, resample)
+
+
+def run_query(
+    min_length=None, max_length=None,
+    min_width=None, max_width=None,
+    min_height=None, max_height=None,
+    min_thickness=None, max_thickness=None,
+    min_volume=None, max_volume=None,
+    min_load_capacity=None,
+    min_temp=None, max_temp=None,
+    material=None, fragile=None,
+    stackable=None, waterproof=None, fire_retardant=None,
+    color=None, country=None,
+    limit=None,
+    sample_with_replacement=False
 ):
-    raw_results = run_query(
+    """Random sample of `limit` matching boxes (all matches, shuffled, if limit is None or 0)."""
+    filters = box_filters(
         min_length, max_length,
         min_width, max_width,
         min_height, max_height,
@@ -109,21 +387,143 @@ def download_csv(
         material, fragile,
         stackable, waterproof, fire_retardant,
         color, country,
-        None  # no LIMIT in SQL
     )
 
-    if sample_with_replacement and limit and raw_results:
-        results = random.choices(raw_results, k=limit)
-    else:
-        results = raw_results[:limit] if limit else raw_results
+    with get_pool().connection() as conn:
+        batches = iter_batches(conn.cursor(), filters, limit or None, sample_with_replacement)
+        columns = next(batches)
+        return [dict(zip(columns, row)) for batch in batches for row in batch]
 
-    df = pd.DataFrame(results)
-    csv = df.to_csv(index=False)
-    return StreamingResponse(StringIO(csv), media_type="text/csv", headers={"Content-Disposition": "attachment; filename=boxes.csv"})
 
+def query_batches(filters, limit=None, sample_with_replacement=False, seed=None, strata=None, shuffle=True):
+    """iter_batches() on a pooled connection, returned to the pool when the generator finishes.
 
-@app.get("/download/excel")
-def download_excel(
+    A complete export (limit=None or 0) is shuffled as before, or streamed in
+    table order with shuffle=False. The same `seed` gives the same sample as
+    long as the database does not change.
+    """
+    rng = random if seed is None else random.Random(seed)
+    with get_pool().connection() as conn:
+        yield from iter_batches(conn.cursor(), filters, limit or None, sample_with_replacement,
+                                shuffle=shuffle, rng=rng, strata=strata)
+
+
+def batch_candidates(cursor, filter_sets):
+    """{cache_key: rowids} for the filter combinations of a batch download, looked up together.
+
+    With the in-memory engine every combination is resolved there. Otherwise
+    cached results are reused and, when at least SHARED_SCAN_MIN remain, all
+    of them are matched in one table scan (shared_scan.py) and cached; fewer
+    are left to candidate_rowids(), one indexed query each.
+    """
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    engine = engine_loader.get(version) if engine_loader is not None else None
+    known, missing = {}, {}
+    for filters in filter_sets:
+        key = cache_key(*build_where(**filters))
+        if key in known or key in missing:
+            continue
+        if engine is not None:
+            known[key] = engine.select(filters)
+        else:
+            result_cache.validate(version)
+            rowids = result_cache.get(key)
+            if rowids is None:
+                missing[key] = filters
+            else:
+                known[key] = rowids
+    if len(missing) >= SHARED_SCAN_MIN:
+        for key, rowids in zip(missing, scan_rowids(cursor, list(missing.values()))):
+            known[key] = result_cache.put(key, rowids)
+    return known
+
+
+def batch_entries(lists, stream, extension):
+    """Yield (file name, chunks) per picking list of a batch download.
+
+    `lists` holds (list id, filters, limit, sample_with_replacement, seed,
+    strata) tuples. All samples are drawn first, then every sampled box is
+    read once in rowid order, however many lists contain it, and the
+    connection goes back to the pool before the files are encoded.
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        filter_sets = []
+        for _, filters, _, _, _, strata in lists:
+            if not build_where(**filters)[1]:
+                continue  # drawn from the rowid range or boxes_strata, no lookup needed
+            filter_sets += [{**filters, strata[0]: value} for value in strata[1]] if strata else [filters]
+        with phase("select"):
+            known = batch_candidates(cursor, filter_sets)
+
+        def draw(filters, limit, sample_with_replacement, seed, strata, known):
+            rng = random if seed is None else random.Random(seed)
+            if strata is not None:
+                return stratified_rowids(cursor, filters, strata, sample_with_replacement, rng, known)
+            return sample_rowids(cursor, filters, limit, sample_with_replacement, rng, known)
+
+        samples = [draw(*spec[1:], known) for spec in lists]
+        columns = table_columns(cursor)
+        with phase("fetch"):
+            rows = rows_by_rowid(cursor, sorted(set().union(*samples)))
+        # Rowids gone since they were sampled (an import committed meanwhile): draw those lists again
+        stale = [i for i, rowids in enumerate(samples) if any(rowid not in rows for rowid in rowids)]
+        for i in stale:
+            _, filters, _, _, _, strata = lists[i]
+            drop_cached([{**filters, strata[0]: value} for value in strata[1]] if strata else [filters])
+            samples[i] = draw(*lists[i][1:], None)
+        if stale:
+            with phase("fetch"):
+                rows.update(rows_by_rowid(cursor, sorted(set().union(*(samples[i] for i in stale)) - rows.keys())))
+        count("rows_returned", sum(len(rowids) for rowids in samples))
+
+    for (list_id, *_), rowids in zip(lists, samples):
+        rowids = [rowid for rowid in rowids if rowid in rows]
+        batches = iter([columns] + [[rows[rowid] for rowid in rowids[start:start + FETCH_BATCH]]
+                                    for start in range(0, len(rowids), FETCH_BATCH)])
+        yield f"{list_id}.{extension}", stream(batches)
+
+
+def stream_csv(batches):
+    """Yield the CSV export as encoded chunks, one per batch of rows."""
+    buffer = StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(next(batches))
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")  # header only, if nothing matched
+
+
+def stream_xlsx(batches):
+    """Yield the Excel export in chunks of XLSX_CHUNK bytes.
+
+    Rows go from the cursor into a write-only openpyxl workbook, which keeps
+    only the current row in memory. The finished file is spooled to disk once
+    it exceeds XLSX_SPOOL bytes and then streamed.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Boxes")
+    header = []
+    for name in next(batches):
+        cell = WriteOnlyCell(sheet, value=name)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    sheet.append(header)
+    for batch in batches:
+        for row in batch:
+            sheet.append(row)
+
+    with SpooledTemporaryFile(max_size=XLSX_SPOOL) as output:
+        workbook.save(output)
+        output.seek(0)
+        while chunk := output.read(XLSX_CHUNK):
+            yield chunk
+
+
+def box_filters(
     min_length: Optional[float] = Query(None, ge=20, le=100),
     max_length: Optional[float] = Query(None, ge=20, le=100),
     min_width: Optional[float] = Query(None, ge=5, le=99),
@@ -144,36 +544,339 @@ def download_excel(
     fire_retardant: Optional[YesNoEnum] = Query(None),
     color: Optional[ColorEnum] = Query(None),
     country: Optional[CountryEnum] = Query(None),
-    limit: Optional[int] = Query(100),
-    sample_with_replacement: Optional[bool] = Query(False, description="Allow duplicate boxes (sample with replacement)")
 ):
-    raw_results = run_query(
-        min_length, max_length,
-        min_width, max_width,
-        min_height, max_height,
-        min_thickness, max_thickness,
-        min_volume, max_volume,
-        min_load_capacity,
-        min_temp, max_temp,
-        material, fragile,
-        stackable, waterproof, fire_retardant,
-        color, country,
-        None  # no LIMIT in SQL
+    """The filter query parameters shared by every download endpoint, as build_where() keywords."""
+    return dict(
+        min_length=min_length, max_length=max_length,
+        min_width=min_width, max_width=max_width,
+        min_height=min_height, max_height=max_height,
+        min_thickness=min_thickness, max_thickness=max_thickness,
+        min_volume=min_volume, max_volume=max_volume,
+        min_load_capacity=min_load_capacity,
+        min_temp=min_temp, max_temp=max_temp,
+        material=material, fragile=fragile,
+        stackable=stackable, waterproof=waterproof, fire_retardant=fire_retardant,
+        color=color, country=country,
     )
 
-    if sample_with_replacement and limit and raw_results:
-        results = random.choices(raw_results, k=limit)
-    else:
-        results = raw_results[:limit] if limit else raw_results
 
-    df = pd.DataFrame(results)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Boxes")
-    output.seek(0)
+def sampling_options(
+    filters: dict = Depends(box_filters),
+    seed: Optional[int] = Query(None, description="Random seed: the same seed gives the same boxes"),
+    stratify_by: Optional[StratifyEnum] = Query(None, description="Categorical column the quotas refer to"),
+    quotas: Optional[str] = Query(None, description="Boxes per value of stratify_by, e.g. Wood:30,Cardboard:70 "
+                                                    "(replaces limit)"),
+    shuffle: bool = Query(True, description="With limit=0, shuffle all matching boxes; false streams them in "
+                                            "table order with little memory"),
+):
+    """Seed, stratification and shuffle parameters shared by every download endpoint, as query_batches() keywords."""
+    return dict(seed=seed, strata=parse_strata(filters, stratify_by, quotas), shuffle=shuffle)
+
+
+def parse_strata(filters, stratify_by, quotas):
+    """(stratify_by, {value: count}) for query_batches(), or None without stratification; 422 if invalid."""
+    if (stratify_by is None) != (quotas is None):
+        raise HTTPException(status_code=422, detail="stratify_by and quotas must be given together")
+    if stratify_by is None:
+        return None
+    if filters[stratify_by] is not None:
+        raise HTTPException(status_code=422, detail=f"Cannot filter and stratify by {stratify_by} at once")
+    enum = {"material": MaterialEnum, "color": ColorEnum, "country": CountryEnum}.get(stratify_by, YesNoEnum)
+    allowed = get_args(enum)
+    counts = {}
+    for entry in quotas.split(","):
+        value, _, count = entry.rpartition(":")
+        value = value.strip()
+        if value not in allowed or not count.strip().isdigit():
+            raise HTTPException(status_code=422,
+                                detail=f"Invalid quota {entry!r}: expected value:count with value in {list(allowed)}")
+        counts[value] = counts.get(value, 0) + int(count)
+    return stratify_by, counts
+
+
+class RequestSlots:
+    """At most `limit` downloads in flight; others wait up to `wait` seconds for a slot."""
+
+    def __init__(self, limit, wait):
+        self.limit = limit
+        self.wait = wait
+        self.loop = None
+        self.semaphore = None
+
+    async def acquire(self):
+        """A release function (safe to call more than once, from any thread), or None on timeout."""
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop, self.semaphore = loop, asyncio.Semaphore(self.limit)
+        semaphore = self.semaphore
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.wait)
+        except asyncio.TimeoutError:
+            return None
+        lock = threading.Lock()
+        released = False
+
+        def release():
+            nonlocal released
+            with lock:
+                if released:
+                    return
+                released = True
+            loop.call_soon_threadsafe(semaphore.release)
+        return release
+
+
+request_slots = RequestSlots(MAX_IN_FLIGHT, QUEUE_WAIT)
+
+
+def next_chunk(chunks):
+    """The next chunk of a download (None at the end); time not spent in select/fetch counts as encoding."""
+    with phase("encode"):
+        return next(chunks, None)
+
+
+async def run_in_workers(chunks, release):
+    """Advance the sync `chunks` generator on the bounded executor, one chunk at a time.
+
+    The request slot is released when the stream ends or the client goes away;
+    the generator is closed once no worker is running it any more.
+    """
+    context = contextvars.copy_context()  # the request's timings (metrics.py)
+    future = None
+    try:
+        while True:
+            future = executor.submit(context.run, next_chunk, chunks)
+            chunk = await asyncio.wrap_future(future)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        if future is not None and not future.done():
+            future.add_done_callback(lambda _: chunks.close())
+        else:
+            chunks.close()
+        release()
+
+
+async def prepend(first, body):
+    try:
+        if first is not None:
+            yield first
+        async for chunk in body:
+            yield chunk
+    finally:
+        await body.aclose()
 
+
+async def download(stream, batches, media_type, file_name):
+    with phase("queue"):
+        release = await request_slots.acquire()
+    if release is None:
+        batches.close()
+        raise HTTPException(status_code=503, detail="Too many downloads in progress, retry shortly",
+                            headers={"Retry-After": "1"})
+    body = run_in_workers(stream(batches), release)
+    weakref.finalize(body, release)  # also frees the slot if the stream is never started
+    # The first chunk is produced before the headers, so Server-Timing covers the query and,
+    # for small picking lists, the whole file
+    first = await anext(body, None)
     return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=boxes.xlsx"}
+        prepend(first, body),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={file_name}"}
     )
+
+
+def require_pyarrow():
+    if not exports.pyarrow_available():
+        raise HTTPException(status_code=501, detail="Parquet and Arrow downloads need pyarrow: pip install pyarrow")
+
+
+@app.get("/download/csv")
+async def download_csv(
+    filters: dict = Depends(box_filters),
+    limit: Optional[int] = Query(100, ge=0),
+    sample_with_replacement: Optional[bool] = Query(False, description="Allow duplicate boxes (sample with replacement)"),
+    sampling: dict = Depends(sampling_options),
+):
+    batches = query_batches(filters, limit, sample_with_replacement, **sampling)
+    return await download(stream_csv, batches, "text/csv", "boxes.csv")
+
+
+@app.get("/download/excel")
+async def download_excel(
+    filters: dict = Depends(box_filters),
+    limit: Optional[int] = Query(100, ge=0),
+    sample_with_replacement: Optional[bool] = Query(False, description="Allow duplicate boxes (sample with replacement)"),
+    sampling: dict = Depends(sampling_options),
+):
+    batches = query_batches(filters, limit, sample_with_replacement, **sampling)
+    return await download(stream_xlsx, batches,
+                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "boxes.xlsx")
+
+
+@app.get("/download/ndjson")
+async def download_ndjson(
+    filters: dict = Depends(box_filters),
+    limit: Optional[int] = Query(100, ge=0),
+    sample_with_replacement: Optional[bool] = Query(False, description="Allow duplicate boxes (sample with replacement)"),
+    sampling: dict = Depends(sampling_options),
+):
+    """One JSON object per line, with Yes/No flags as booleans."""
+    batches = query_batches(filters, limit, sample_with_replacement, **sampling)
+    return await download(exports.stream_ndjson, batches, "application/x-ndjson", "boxes.ndjson")
+
+
+@app.get("/download/parquet")
+async def download_parquet(
+    filters: dict = Depends(box_filters),
+    limit: Optional[int] = Query(100, ge=0),
+    sample_with_replacement: Optional[bool] = Query(False, description="Allow duplicate boxes (sample with replacement)"),
+    sampling: dict = Depends(sampling_options),
+):
+    """Parquet file with boolean flags and dictionary-encoded Material, Color and Country (needs pyarrow)."""
+    require_pyarrow()
+    batches = query_batches(filters, limit, sample_with_replacement, **sampling)
+    stream = partial(exports.stream_parquet, categories=categories)
+    return await download(stream, batches, "application/vnd.apache.parquet", "boxes.parquet")
+
+
+@app.get("/download/arrow")
+async def download_arrow(
+    filters: dict = Depends(box_filters),
+    limit: Optional[int] = Query(100, ge=0),
+    sample_with_replacement: Optional[bool] = Query(False, description="Allow duplicate boxes (sample with replacement)"),
+    sampling: dict = Depends(sampling_options),
+):
+    """Arrow IPC stream with the same types as the Parquet download (needs pyarrow)."""
+    require_pyarrow()
+    batches = query_batches(filters, limit, sample_with_replacement, **sampling)
+    stream = partial(exports.stream_arrow, categories=categories)
+    return await download(stream, batches, "application/vnd.apache.arrow.stream", "boxes.arrows")
+
+
+class PickingList(BaseModel):
+    """One picking list of a batch download: its ID, the download filters and sampling options."""
+    id: str = Field(pattern=r"^[A-Za-z0-9_.-]{1,64}$", description="Name of the list's file in the archive")
+    min_length: Optional[float] = Field(None, ge=20, le=100)
+    max_length: Optional[float] = Field(None, ge=20, le=100)
+    min_width: Optional[float] = Field(None, ge=5, le=99)
+    max_width: Optional[float] = Field(None, ge=5, le=99)
+    min_height: Optional[float] = Field(None, ge=5, le=95)
+    max_height: Optional[float] = Field(None, ge=5, le=95)
+    min_thickness: Optional[float] = None
+    max_thickness: Optional[float] = None
+    min_volume: Optional[float] = None
+    max_volume: Optional[float] = None
+    min_load_capacity: Optional[float] = None
+    min_temp: Optional[int] = Field(None, ge=-45, le=120)
+    max_temp: Optional[int] = Field(None, ge=-45, le=120)
+    material: Optional[MaterialEnum] = None
+    fragile: Optional[YesNoEnum] = None
+    stackable: Optional[YesNoEnum] = None
+    waterproof: Optional[YesNoEnum] = None
+    fire_retardant: Optional[YesNoEnum] = None
+    color: Optional[ColorEnum] = None
+    country: Optional[CountryEnum] = None
+    limit: int = Field(100, ge=1)
+    sample_with_replacement: bool = False
+    seed: Optional[int] = None
+    stratify_by: Optional[StratifyEnum] = None
+    quotas: Optional[str] = Field(None, description="Boxes per value of stratify_by, e.g. Wood:30,Cardboard:70")
+
+
+class BatchRequest(BaseModel):
+    format: Literal["csv", "excel", "ndjson", "parquet", "arrow"] = "csv"
+    lists: List[PickingList] = Field(min_length=1, max_length=BATCH_MAX_LISTS)
+
+
+filter_names = list(inspect.signature(build_where).parameters)
+
+# format -> (encoder, file extension, compress inside the zip)
+batch_formats = {
+    "csv": (stream_csv, "csv", True),
+    "excel": (stream_xlsx, "xlsx", False),
+    "ndjson": (exports.stream_ndjson, "ndjson", True),
+    "parquet": (partial(exports.stream_parquet, categories=categories), "parquet", False),
+    "arrow": (partial(exports.stream_arrow, categories=categories), "arrows", True),
+}
+
+
+@app.post("/download/batch")
+async def download_batch(request: BatchRequest):
+    """Many picking lists in one request, as a zip archive with one file per list ID.
+
+    The lists share one connection, one lookup per distinct filter combination
+    (a single table scan when there are many) and one read of the sampled boxes.
+    """
+    if request.format in ("parquet", "arrow"):
+        require_pyarrow()
+    lists, seen, total = [], set(), 0
+    for spec in request.lists:
+        if spec.id in seen:
+            raise HTTPException(status_code=422, detail=f"Duplicate list id {spec.id!r}")
+        seen.add(spec.id)
+        filters = spec.model_dump(include=set(filter_names))
+        try:
+            strata = parse_strata(filters, spec.stratify_by, spec.quotas)
+        except HTTPException as error:
+            raise HTTPException(status_code=422, detail=f"{spec.id}: {error.detail}") from None
+        total += sum(strata[1].values()) if strata else spec.limit
+        lists.append((spec.id, filters, spec.limit, spec.sample_with_replacement, spec.seed, strata))
+    if total > BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"{total} boxes requested, at most {BATCH_MAX_ROWS} per batch")
+
+    stream, extension, compress = batch_formats[request.format]
+    entries = batch_entries(lists, stream, extension)
+    return await download(partial(exports.stream_zip, compress=compress), entries,
+                          "application/zip", "picking_lists.zip")
+
+
+def count_facets(filters):
+    with get_pool().connection() as conn, phase("select"):
+        engine = None
+        if engine_loader is not None:
+            engine = engine_loader.get(conn.execute("PRAGMA user_version").fetchone()[0])
+        result = facets.facet_counts(conn, filters, *build_where(**filters), engine=engine)
+        if result["source"] != "cube":
+            count("rows_scanned", result["count"])
+        return result
+
+
+@app.get("/facets")
+async def facet_counts(filters: dict = Depends(box_filters)):
+    """Number of matching boxes, their split by Material, Color, Country and flags, and numeric histograms.
+
+    Answered from aggregates built at import time when only categorical filters are set.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, context.run, count_facets, filters)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Request, phase, row and byte histograms per endpoint in the Prometheus text format (see metrics.py)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    """Hits, misses, evictions, expirations and invalidations of the filter-result cache."""
+    return result_cache.metrics()
+
+
+@app.get("/metrics/engine")
+def engine_metrics():
+    """State of the in-memory filter engine (API_MEMORY_ENGINE=1)."""
+    if engine_loader is None:
+        return {"enabled": False}
+    engine = engine_loader.engine
+    return {
+        "enabled": True,
+        "loaded": engine is not None,
+        "loading": engine_loader.loading,
+        "db_version": engine.version if engine else None,
+        "rows": engine.rows if engine else 0,
+        "memory_mb": round(engine.memory_bytes() / 1e6, 1) if engine else 0,
+        "error": engine_loader.error,
+    }
@@ -0,0 +1,197 @@
+# memory_engine.py
+"""
+In-memory filter engine for the filter API (enable with API_MEMORY_ENGINE=1).
+
+The boxes table is loaded once into NumPy columns. Every categorical value
+(Material, Color, Country of Origin and the Yes/No flags) gets a packed
+bitmap, and every range column a sorted index (values in order plus their
+row positions). A filter set then resolves without SQLite:
+
+1. AND the bitmaps of the equality filters
+2. take the range filter matching the fewest rows (two binary searches) as
+   the starting candidates if it is more selective than the bitmap
+3. check the remaining conditions on the candidate rows only
+
+The result is the matching rowids, so sampling and row lookups stay the same
+as with the SQLite path, which is also used while the engine (re)loads.
+"""
+import threading
+from array import array
+
+import numpy as np
+
+LOAD_BATCH = 50_000
+
+# build_where() keyword -> (column, operator)
+range_filters = {
+    "min_length": ("Length (cm)", ">="), "max_length": ("Length (cm)", "<="),
+    "min_width": ("Width (cm)", ">="), "max_width": ("Width (cm)", "<="),
+    "min_height": ("Height (cm)", ">="), "max_height": ("Height (cm)", "<="),
+    "min_thickness": ("Thickness (cm)", ">="), "max_thickness": ("Thickness (cm)", "<="),
+    "min_volume": ("External Volume (L)", ">="), "max_volume": ("External Volume (L)", "<="),
+    "min_load_capacity": ("Max Load Capacity (kg)", ">="),
+    "min_temp": ("Min Temperature (°C)", ">="), "max_temp": ("Max Temperature (°C)", "<="),
+}
+equality_filters = {
+    "material": "Material", "fragile": "Fragile", "stackable": "Stackable", "waterproof": "Waterproof",
+    "fire_retardant": "Fire Retardant", "color": "Color", "country": "Country of Origin",
+}
+range_columns = sorted({column for column, _ in range_filters.values()})
+bitmap_columns = list(equality_filters.values())
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class MemoryEngine:
+    """Column store of the boxes table with bitmap and sorted indexes."""
+
+    def __init__(self, rowids, values, categories, version=None):
+        self.version = version
+        self.rows = len(rowids)
+        self.rowids = rowids
+        self.values = values  # range column -> values in row order
+        self.sorted_values = {}
+        self.order = {}
+        for column, column_values in values.items():
+            order = np.argsort(column_values, kind="stable").astype(np.int32)
+            self.order[column] = order
+            self.sorted_values[column] = column_values[order]
+        self.bitmaps = {
+            column: {value: np.packbits(mask, bitorder="little") for value, mask in masks.items()}
+            for column, masks in categories.items()
+        }
+
+    @classmethod
+    def load(cls, conn):
+        """Read the boxes table (and its PRAGMA user_version) in one pass and build the indexes."""
+        names = range_columns + bitmap_columns
+        conn.execute("BEGIN")  # version and rows from the same snapshot
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        cursor = conn.execute(f"SELECT rowid, {', '.join(_quote(name) for name in names)} FROM boxes")
+        rowids, chunks = [], {name: [] for name in names}
+        while batch := cursor.fetchmany(LOAD_BATCH):
+            columns = list(zip(*batch))
+            rowids.append(np.array(columns[0], dtype=np.int64))
+            for name, column in zip(names, columns[1:]):
+                chunks[name].append(np.array(column, dtype=object if name in bitmap_columns else None))
+        conn.rollback()
+
+        def concat(parts, dtype=None):
+            return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+        values = {}
+        for name in range_columns:
+            column = concat(chunks[name], np.float64)
+            if column.dtype.kind == "i":
+                column = column.astype(np.int32)
+            values[name] = column
+        categories = {}
+        for name in bitmap_columns:
+            column = concat(chunks[name], object)
+            labels, codes = np.unique(column, return_inverse=True)
+            categories[name] = {label: codes == code for code, label in enumerate(labels)}
+        return cls(concat(rowids, np.int64), values, categories, version)
+
+    @staticmethod
+    def bit_test(bitmap, positions):
+        """Bits of a packed bitmap at the given row positions, as a bool array."""
+        return ((bitmap[positions >> 3] >> (positions & 7).astype(np.uint8)) & 1).astype(bool)
+
+    def positions(self, filters):
+        """Sorted row positions matching the build_where() keyword filters."""
+        bitmap = None
+        for name, column in equality_filters.items():
+            value = filters.get(name)
+            if not value:
+                continue
+            match = self.bitmaps[column].get(value)
+            if match is None:
+                return np.empty(0, dtype=np.int64)
+            bitmap = match if bitmap is None else bitmap & match
+
+        bounds = {}
+        for name, (column, op) in range_filters.items():
+            value = filters.get(name)
+            if value is None:
+                continue
+            low, high = bounds.get(column, (-np.inf, np.inf))
+            bounds[column] = (max(low, value), high) if op == ">=" else (low, min(high, value))
+        spans = []
+        for column, (low, high) in bounds.items():
+            start = np.searchsorted(self.sorted_values[column], low, side="left")
+            stop = np.searchsorted(self.sorted_values[column], high, side="right")
+            spans.append((max(stop - start, 0), column, start, stop))
+        spans.sort(key=lambda span: span[0])
+
+        if spans and (bitmap is None or spans[0][0] < int(_POPCOUNT[bitmap].sum())):
+            _, column, start, stop = spans.pop(0)
+            positions = np.sort(self.order[column][start:stop])
+            if bitmap is not None:
+                positions = positions[self.bit_test(bitmap, positions)]
+        elif bitmap is not None:
+            positions = np.flatnonzero(np.unpackbits(bitmap, count=self.rows, bitorder="little"))
+        else:
+            positions = np.arange(self.rows)
+        for _, column, _, _ in spans:
+            low, high = bounds[column]
+            column_values = self.values[column][positions]
+            positions = positions[(column_values >= low) & (column_values <= high)]
+        return positions
+
+    def select(self, filters):
+        """Rowids (in table order) matching the build_where() keyword filters, as an array('q')."""
+        result = array("q")
+        result.frombytes(self.rowids[self.positions(filters)].astype(np.int64).tobytes())
+        return result
+
+    def memory_bytes(self):
+        arrays = [self.rowids, *self.values.values(), *self.sorted_values.values(), *self.order.values()]
+        arrays += [bitmap for masks in self.bitmaps.values() for bitmap in masks.values()]
+        return sum(a.nbytes for a in arrays)
+
+
+class EngineLoader:
+    """Holds the current engine and rebuilds it in the background when the database version changes."""
+
+    def __init__(self, connect):
+        self.connect = connect  # context manager factory returning a database connection
+        self.engine = None
+        self.loading = False
+        self.failed_version = None
+        self.lock = threading.Lock()
+        self.error = None
+
+    def get(self, version):
+        """The engine for `version`, or None (and a reload is started) if it is not loaded yet."""
+        engine = self.engine
+        if engine is not None and engine.version == version:
+            return engine
+        if version != self.failed_version:
+            self.start(version)
+        return None
+
+    def start(self, version=None):
+        with self.lock:
+            if self.loading:
+                return
+            self.loading = True
+        threading.Thread(target=self._load, args=(version,), name="memory-engine-load", daemon=True).start()
+
+    def load(self):
+        with self.connect() as conn:
+            self.engine = MemoryEngine.load(conn)
+
+    def _load(self, version):
+        try:
+            self.load()
+            self.error = self.failed_version = None
+        except Exception as error:  # keep serving from SQLite; retried when the version changes
+            self.error = repr(error)
+            self.failed_version = version
+        finally:
+            with self.lock:
+                self.loading = False
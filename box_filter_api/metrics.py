@@ -0,0 +1,176 @@
+# metrics.py
+"""
+Per-request phase timers and Prometheus metrics for the filter API.
+
+TimingMiddleware gives every request a RequestTimings object (through a
+context variable, which the download workers inherit). Code on the request
+path records into it:
+
+    with phase("select"):      # time, exclusive of nested phases
+        ...
+    count("rows_returned", n)  # rows_scanned, rows_returned
+
+Phases: queue (waiting for a download slot), select (finding and sampling
+the matching rowids), fetch (reading rows) and encode (CSV / Excel / Arrow
+... serialization). The total time and the bytes sent are measured by the
+middleware. When the request ends everything is added to the histograms
+served at GET /metrics in the Prometheus text format.
+
+⚙️ API_SERVER_TIMING=1 adds a Server-Timing header with the phases that ran
+before the response headers were sent (for downloads: the first chunk,
+i.e. the whole file for picking lists up to 500 rows).
+"""
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+SERVER_TIMING = os.environ.get("API_SERVER_TIMING", "0") == "1"
+
+PHASES = ("queue", "select", "fetch", "encode")
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROWS_BUCKETS = (0, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000, 1_000_000_000)
+
+current = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """Thread-safe Prometheus histogram with one label set per endpoint (and phase)."""
+
+    def __init__(self, name, help_text, buckets, labels):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self.series = defaultdict(lambda: [[0] * (len(buckets) + 1), 0.0, 0])  # labels -> counts, sum, count
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self.lock:
+            series = self.series[labels]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted((labels, (list(counts), total, n)) for labels, (counts, total, n) in self.series.items())
+        for labels, (counts, total, n) in series:
+            label_text = ",".join(f'{key}="{value}"' for key, value in zip(self.labels, labels))
+            cumulative = 0
+            for bound, bucket in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {n}")
+        return "\n".join(lines)
+
+
+phase_seconds = Histogram("box_api_phase_seconds", "Time per request spent in each phase",
+                          SECONDS_BUCKETS, ("endpoint", "phase"))
+request_seconds = Histogram("box_api_request_seconds", "Total request time, until the last byte was sent",
+                            SECONDS_BUCKETS, ("endpoint", "status"))
+rows_scanned = Histogram("box_api_rows_scanned", "Rowids or rows read while selecting the boxes of a request",
+                         ROWS_BUCKETS, ("endpoint",))
+rows_returned = Histogram("box_api_rows_returned", "Boxes written to the response", ROWS_BUCKETS, ("endpoint",))
+bytes_sent = Histogram("box_api_response_bytes", "Response body size", BYTES_BUCKETS, ("endpoint",))
+histograms = [request_seconds, phase_seconds, rows_scanned, rows_returned, bytes_sent]
+
+
+class RequestTimings:
+    """Phase durations (exclusive of nested phases) and row counters of one request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.bytes_sent = 0
+        self.stack = []  # [phase, start of its current stretch]
+
+    @contextmanager
+    def phase(self, name):
+        now = time.perf_counter()
+        if self.stack:
+            parent = self.stack[-1]
+            self.seconds[parent[0]] += now - parent[1]
+        self.stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.seconds[name] += now - self.stack.pop()[1]
+            if self.stack:
+                self.stack[-1][1] = now
+
+    def server_timing(self):
+        return ", ".join(f"{name};dur={self.seconds[name] * 1000:.1f}" for name in PHASES if name in self.seconds)
+
+    def record(self, endpoint, status):
+        request_seconds.observe(time.perf_counter() - self.start, endpoint, str(status))
+        for name in PHASES:
+            if name in self.seconds:
+                phase_seconds.observe(self.seconds[name], endpoint, name)
+        if self.counts or self.seconds:  # requests that query boxes
+            rows_scanned.observe(self.counts["rows_scanned"], endpoint)
+            rows_returned.observe(self.counts["rows_returned"], endpoint)
+        bytes_sent.observe(self.bytes_sent, endpoint)
+
+
+@contextmanager
+def phase(name):
+    """Time the block as phase `name` of the current request (no-op outside a request)."""
+    timings = current.get()
+    if timings is None:
+        yield
+        return
+    with timings.phase(name):
+        yield
+
+
+def count(name, n):
+    timings = current.get()
+    if timings is not None:
+        timings.counts[name] += n
+
+
+class TimingMiddleware:
+    """ASGI middleware: one RequestTimings per HTTP request, recorded once the last byte is sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = current.set(timings)
+        status = 500
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING and timings.seconds:
+                    message["headers"] = [*message.get("headers", []),
+                                          (b"server-timing", timings.server_timing().encode())]
+            elif message["type"] == "http.response.body":
+                timings.bytes_sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            current.reset(token)
+            route = scope.get("route")
+            timings.record(getattr(route, "path", "unmatched"), status)
+
+
+def render():
+    """All histograms in the Prometheus text exposition format."""
+    return "\n".join(histogram.render() for histogram in histograms) + "\n"
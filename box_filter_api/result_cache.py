@@ -0,0 +1,114 @@
+# result_cache.py
+"""
+Cache of filter results (the matching rowids) for the filter API.
+
+A filter combination is looked up once; later requests with the same filters
+draw a fresh random sample from the cached rowids. Entries are bounded by
+count and by total rowids (least recently used evicted first) and expire
+after a TTL. Every import_excel.py transaction that changes the boxes table
+increments `PRAGMA user_version` of packages.db, and a changed version empties
+the cache. Rowids that still turn out to be gone (a commit between the version
+check and the fetch) make main.py discard the entry and look the filters up again.
+
+⚙️ Environment variables:
+   RESULT_CACHE_ENTRIES     max cached filter combinations (default 256, 0 disables the cache)
+   RESULT_CACHE_MAX_ROWIDS  max rowids across all entries (default 5 000 000, about 40 MB)
+   RESULT_CACHE_TTL         seconds an entry stays valid (default 300)
+"""
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_ENTRIES", 256))
+MAX_ROWIDS = int(os.environ.get("RESULT_CACHE_MAX_ROWIDS", 5_000_000))
+TTL = float(os.environ.get("RESULT_CACHE_TTL", 300))
+
+
+def cache_key(where, params):
+    """build_where() emits the conditions in a fixed order, so (where, params) identifies the filter set."""
+    return where, tuple(params)
+
+
+class ResultCache:
+    """Thread-safe LRU + TTL map from filter key to an array of matching rowids."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_rowids=MAX_ROWIDS, ttl=TTL):
+        self.max_entries = max_entries
+        self.max_rowids = max_rowids
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expiry time, rowids)
+        self.rowids = 0
+        self.version = None
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def validate(self, version):
+        """Drop every entry if the database version changed since the last call."""
+        with self.lock:
+            if version == self.version:
+                return
+            if self.version is not None:
+                self.stats["invalidations"] += 1
+            self.version = version
+            self.entries.clear()
+            self.rowids = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(key)
+                self.stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key, rowids):
+        rowids = array("q", rowids)
+        with self.lock:
+            if self.max_entries <= 0 or len(rowids) > self.max_rowids:
+                return rowids
+            if key in self.entries:
+                self._drop(key)
+            while self.entries and (len(self.entries) >= self.max_entries
+                                    or self.rowids + len(rowids) > self.max_rowids):
+                self._drop(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+            self.entries[key] = (time.monotonic() + self.ttl, rowids)
+            self.rowids += len(rowids)
+            return rowids
+
+    def discard(self, key):
+        """Forget one entry, e.g. when its rowids turned out to be stale."""
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+
+    def _drop(self, key):
+        _, rowids = self.entries.pop(key)
+        self.rowids -= len(rowids)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.rowids = 0
+
+    def metrics(self):
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_ratio": self.stats["hits"] / lookups if lookups else None,
+                "entries": len(self.entries),
+                "rowids": self.rowids,
+                "max_entries": self.max_entries,
+                "max_rowids": self.max_rowids,
+                "ttl_seconds": self.ttl,
+                "db_version": self.version,
+            }
@@ -0,0 +1,48 @@
+# shared_scan.py
+"""
+Evaluate many filter combinations in one pass over the boxes table.
+
+Used by the batch download (POST /download/batch) when the in-memory engine
+is not loaded: instead of one indexed query per picking list, the filter
+columns are read once, SCAN_BATCH rows at a time, and every filter
+combination is checked on each batch with vectorized NumPy comparisons.
+"""
+from array import array
+
+import numpy as np
+
+from memory_engine import equality_filters, range_filters
+
+SCAN_BATCH = 50_000
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _conditions(filters):
+    """(column, operator, value) for every filter that is set (build_where() keywords)."""
+    conditions = [(column, op, filters[name]) for name, (column, op) in range_filters.items()
+                  if filters.get(name) is not None]
+    conditions += [(column, "=", filters[name]) for name, column in equality_filters.items() if filters.get(name)]
+    return conditions
+
+
+def scan_rowids(cursor, filter_sets):
+    """Matching rowids (array('q'), rowid order) for every build_where() keyword dict in `filter_sets`."""
+    conditions = [_conditions(filters) for filters in filter_sets]
+    names = sorted({column for condition in conditions for column, _, _ in condition})
+    results = [array("q") for _ in filter_sets]
+    select = ", ".join(["rowid"] + [_quote(name) for name in names])
+    cursor.execute(f"SELECT {select} FROM boxes ORDER BY rowid")
+    while rows := cursor.fetchmany(SCAN_BATCH):
+        data = list(zip(*rows))
+        rowids = np.array(data[0], dtype=np.int64)
+        columns = {name: np.array(values) for name, values in zip(names, data[1:])}
+        for condition, result in zip(conditions, results):
+            mask = np.ones(len(rowids), dtype=bool)
+            for column, op, value in condition:
+                values = columns[column]
+                mask &= values >= value if op == ">=" else values <= value if op == "<=" else values == value
+            result.frombytes(rowids[mask].tobytes())
+    return results
@@ -0,0 +1,85 @@
+# strata.py
+"""
+Per-stratum rowid indexes for stratified sampling (stratify_by + quotas).
+
+import_excel.py lists the rowids of every categorical value (Material, Color,
+Country of Origin and the Yes/No flags) in rowid order and stores the lists
+in boxes_strata, cut into chunks of STRATUM_CHUNK rowids:
+
+    (column_name, value, chunk) -> rowids   (packed 64-bit integers)
+
+Position p of a stratum is entry p % STRATUM_CHUNK of chunk p // STRATUM_CHUNK.
+Drawing k boxes from a stratum is then: its size (one seek for the last
+chunk), k random positions and at most k chunk lookups, so the cost follows
+the sample size, not the table or stratum size.
+"""
+import sqlite3
+from array import array
+from collections import defaultdict
+
+from memory_engine import equality_filters
+
+STRATA_TABLE = "boxes_strata"
+STRATUM_CHUNK = 256  # rowids per stored chunk (2 KiB)
+LOOKUP_BATCH = 500  # chunks per "chunk IN (...)" lookup
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def build_strata(conn):
+    """(Re)build the rowid lists of every categorical column.
+
+    Each column is read through its index, (value, rowid) in key order, so
+    the lists come out sorted without sorting. Runs in the caller's
+    transaction (see import_excel.publish).
+    """
+    def chunks(column):
+        cursor = conn.execute(f"SELECT {_quote(column)}, rowid FROM boxes ORDER BY 1, 2")
+        value, rowids, chunk = None, array("q"), 0
+        while batch := cursor.fetchmany(50_000):
+            for next_value, rowid in batch:
+                if next_value != value or len(rowids) == STRATUM_CHUNK:
+                    if rowids:
+                        yield column, value, chunk, rowids.tobytes()
+                    chunk = chunk + 1 if next_value == value else 0
+                    value, rowids = next_value, array("q")
+                rowids.append(rowid)
+        if rowids:
+            yield column, value, chunk, rowids.tobytes()
+
+    conn.execute(f"DROP TABLE IF EXISTS {STRATA_TABLE}")
+    conn.execute(f"CREATE TABLE {STRATA_TABLE} (column_name TEXT NOT NULL, value TEXT NOT NULL, "
+                 f"chunk INTEGER NOT NULL, rowids BLOB NOT NULL, PRIMARY KEY (column_name, value, chunk))")
+    for column in equality_filters.values():
+        conn.executemany(f"INSERT INTO {STRATA_TABLE} VALUES (?, ?, ?, ?)", chunks(column))
+
+
+def stratum_size(cursor, column, value):
+    """Number of boxes with `column` = `value`, or None if the database has no strata table."""
+    try:
+        last = cursor.execute(f"SELECT chunk, length(rowids) FROM {STRATA_TABLE} WHERE column_name = ? AND value = ? "
+                              f"ORDER BY chunk DESC LIMIT 1", (column, value)).fetchone()
+    except sqlite3.OperationalError:
+        return None  # imported before the strata table existed
+    return 0 if last is None else last[0] * STRATUM_CHUNK + last[1] // 8
+
+
+def stratum_rowids(cursor, column, value, positions):
+    """Rowids at the given stratum positions, in the given order (repeated positions are repeated)."""
+    wanted = defaultdict(list)
+    for position in positions:
+        wanted[position // STRATUM_CHUNK].append(position)
+    found = {}
+    chunks = list(wanted)
+    for start in range(0, len(chunks), LOOKUP_BATCH):
+        batch = chunks[start:start + LOOKUP_BATCH]
+        cursor.execute(f"SELECT chunk, rowids FROM {STRATA_TABLE} WHERE column_name = ? AND value = ? "
+                       f"AND chunk IN ({', '.join('?' * len(batch))})", [column, value, *batch])
+        for chunk, blob in cursor:
+            rowids = array("q")
+            rowids.frombytes(blob)
+            for position in wanted[chunk]:
+                found[position] = rowids[position % STRATUM_CHUNK]
+    return [found[position] for position in positions]
@@ -21,22 +21,55 @@ This script generates randomized box specification datasets and exports them as
    pip install pandas
 
 2. Open this file.
-3. Modify line 161 if you want to change the number of records:
-   boxes_data = generate_boxes(10000)
+3. Run the script, optionally changing the number of records (default: 10000):
+   python box_generator.py --rows 50000
 
-   Change `10000` to your desired number (e.g., 500, 1000, 50000, etc.)
-
-4. Run the script:
-   python generate_boxes.py
+   Use your desired number (e.g., 500, 1000, 50000, etc.)
 
 ✅ The Excel file will be saved in your working directory.
 
 💡 Tip:
-You can generate multiple datasets by calling `generate_boxes()` with different values and saving each to a separate filename.
+You can generate multiple datasets in one pass with `--sizes`; every smaller dataset is
+exactly the first rows of the larger ones (see write_boxes_datasets()):
+   python box_generator.py --engine vectorized --seed 1 --sizes 500 1000 100000 --output boxes_{n}.csv
+
+Box IDs run from BX000000 unless `--start-id` sets the first number. Use it when the new
+boxes will be appended to a database that already holds IDs from 0 upwards:
+   python box_generator.py --rows 5000 --start-id 10000 --output new_boxes.csv
+
+⚡ Large datasets:
+`generate_boxes_vectorized()` draws every column at once with a seeded numpy Generator
+and returns a columnar result (see `column_keys`). Select it from the command line with
+   python box_generator.py --engine vectorized --rows 1000000 --seed 42
+and compare both engines with
+   python box_generator.py --benchmark
+
+💾 Streaming export:
+With the vectorized engine, rows are generated in chunks of `--chunk-size` and appended
+to the output file as they are produced, so memory stays flat for any row count:
+   python box_generator.py --engine vectorized --rows 10000000 --output boxes.parquet
+The extension (or `--format`) selects CSV, Parquet, newline-delimited JSON or Excel.
+The Google Colab download only happens when running inside Colab (skip it with `--no-download`).
+
+🧵 Parallel generation:
+`--workers N` spreads the chunks over N processes (0 = all cores). Every chunk is seeded
+from the master seed and its position, so the output is bit-identical for any worker count:
+   python box_generator.py --engine vectorized --rows 50000000 --seed 7 --workers 0 --output boxes.csv
 """
+import argparse
+import os
 import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+from box_dataset import BoxcolWriter, column_keys, columns, columns_to_frame, flag_keys, frame_to_columns
+from box_stats import DatasetSummary, write_summary_sidecar
+
 # Materials and their properties
 materials = ["Cardboard", "Plastic", "Wood", "Metal", "Composite"]
 material_weights = [0.55, 0.25, 0.10, 0.05, 0.05]
@@ -98,7 +131,7 @@ def calculate_load_capacity(material, volume_l, thickness_cm):
     load_capacity = volume_l * thickness_cm * multiplier
     return round(min(load_capacity, 500), 2)
 
-def generate_boxes(n):
+def generate_boxes(n, start_id=0):
     boxes = []
     for i in range(n):
         length = random.randint(20, 100)
@@ -137,7 +170,7 @@ def generate_boxes(n):
         color = random.choice(colors)
         country = random.choice(countries)
 
-        box_id = f"BX{i:06d}"
+        box_id = f"BX{start_id + i:06d}"
         boxes.append([
             box_id, length, width, height, thickness,
             ext_volume, int_volume, max_load,
@@ -148,22 +181,445 @@ def generate_boxes(n):
         ])
     return boxes
 
-# Columns and export
-columns = [
-    "Box ID", "Length (cm)", "Width (cm)", "Height (cm)", "Thickness (cm)",
-    "External Volume (L)", "Internal Volume (L)", "Max Load Capacity (kg)",
-    "Material", "Fragile", "Stackable",
-    "Waterproof", "Fire Retardant",
-    "Min Temperature (°C)", "Max Temperature (°C)",
-    "Color", "Country of Origin"
-]
+# Per-material lookup tables for the vectorized engine (row i belongs to materials[i])
+_material_multipliers = np.array([2.5, 5.5, 6.5, 12, 8])
+_thickness_counts = np.array([len(thickness_options[m]) for m in materials])
+_thickness_table = np.zeros((len(materials), _thickness_counts.max()))
+for _m, _material in enumerate(materials):
+    _thickness_table[_m, :_thickness_counts[_m]] = thickness_options[_material]
+_flag_probs = {
+    "fragile": np.array([fragile_probs[m] for m in materials]),
+    "stackable": np.array([stackable_probs[m] for m in materials]),
+    "waterproof": np.array([waterproof_probs[m] for m in materials]),
+    "fire_retardant": np.array([fire_retardant_probs[m] for m in materials]),
+}
+_min_temp_bounds = np.array([min_temp_ranges[m] for m in materials])
+_max_temp_bounds = np.array([max_temp_ranges[m] for m in materials])
+
+
+def generate_boxes_vectorized(n, seed=None, start=0, rng=None):
+    """Generate `n` boxes column by column with a seeded numpy Generator.
+
+    Follows the same distributions as generate_boxes(), but draws every column in
+    one call instead of looping per record. Returns a dict mapping each name in
+    `column_keys` to a numpy array: Material/Color/Country are integer codes into
+    `materials`/`colors`/`countries`, the Yes/No attributes are booleans and
+    `box_index` holds the number used in the "BX{i:06d}" Box ID, starting at `start`.
+    """
+    if rng is None:
+        rng = np.random.default_rng(seed)
+
+    length = rng.integers(20, 101, size=n)
+
+    width_min = np.maximum(5, (length * 0.05).astype(np.int64))
+    width = rng.integers(width_min, length)
+
+    shortest_side = np.minimum(length, width)
+    height_min = np.maximum(5, (shortest_side * 0.05).astype(np.int64))
+    height = rng.integers(height_min, shortest_side + 1)
+
+    material = rng.choice(len(materials), size=n, p=material_weights).astype(np.int8)
+    option = (rng.random(n) * _thickness_counts[material]).astype(np.int64)
+    thickness = _thickness_table[material, option]
+
+    # Internal dimensions
+    internal_length = np.round(length - 2 * thickness, 2)
+    internal_width = np.round(width - 2 * thickness, 2)
+    internal_height = np.round(height - 2 * thickness, 2)
+
+    ext_volume = np.round((length * width * height) / 1000, 2)  # in liters
+    int_volume = np.round((internal_length * internal_width * internal_height) / 1000, 2)  # in liters
+
+    max_load = np.round(np.minimum(ext_volume * thickness * _material_multipliers[material], 500), 2)
+
+    boxes = {
+        "box_index": np.arange(start, start + n, dtype=np.int64),
+        "length": length.astype(np.int16),
+        "width": width.astype(np.int16),
+        "height": height.astype(np.int16),
+        "thickness": thickness,
+        "ext_volume": ext_volume,
+        "int_volume": int_volume,
+        "max_load": max_load,
+        "material": material,
+    }
+    for key in flag_keys:
+        boxes[key] = rng.random(n) < _flag_probs[key][material]
+
+    # Temperature logic with validation: redraw only the rows where min >= max
+    min_temp = rng.integers(_min_temp_bounds[material, 0], _min_temp_bounds[material, 1] + 1)
+    max_temp = rng.integers(_max_temp_bounds[material, 0], _max_temp_bounds[material, 1] + 1)
+    invalid = np.flatnonzero(min_temp >= max_temp)
+    while invalid.size:
+        redo = material[invalid]
+        min_temp[invalid] = rng.integers(_min_temp_bounds[redo, 0], _min_temp_bounds[redo, 1] + 1)
+        max_temp[invalid] = rng.integers(_max_temp_bounds[redo, 0], _max_temp_bounds[redo, 1] + 1)
+        invalid = invalid[min_temp[invalid] >= max_temp[invalid]]
+    boxes["min_temp"] = min_temp.astype(np.int16)
+    boxes["max_temp"] = max_temp.astype(np.int16)
+
+    boxes["color"] = rng.integers(0, len(colors), size=n).astype(np.int8)
+    boxes["country"] = rng.integers(0, len(countries), size=n).astype(np.int8)
+    return {key: boxes[key] for key in column_keys}
+
+
+# Value lists the Material/Color/Country codes of the vectorized engine index
+dictionaries = {"material": materials, "color": colors, "country": countries}
+
+
+def columns_to_dataframe(boxes):
+    """Turn a columnar result of generate_boxes_vectorized() into the 17-column export layout."""
+    return columns_to_frame(boxes, dictionaries)
+
+
+# Rows generated per chunk in streaming mode; memory use is bounded by one chunk
+CHUNK_SIZE = 100_000
+
+
+def generate_chunk(k, n, entropy, chunk_size=CHUNK_SIZE, start_id=0):
+    """Generate chunk k of an `n`-row stream whose master seed has the given entropy.
+
+    Chunk k covers rows k * chunk_size onwards and is drawn from its own
+    Generator seeded with (entropy, k), so any process can produce any chunk
+    and the rows never depend on which process generated them. Box IDs are
+    numbered from `start_id`.
+    """
+    start = k * chunk_size
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(k,)))
+    return generate_boxes_vectorized(min(chunk_size, n - start), start=start_id + start, rng=rng)
+
+
+class ChunkWriter(ABC):
+    """Base class of the streaming writers.
+
+    encode() turns a columnar chunk into the payload that write() appends to the
+    open file; it has no side effects, so it can run away from the writer.
+    """
+
+    @classmethod
+    def encode(cls, chunk):
+        return cls.encode_frame(columns_to_dataframe(chunk))
+
+    @staticmethod
+    @abstractmethod
+    def encode_frame(df):
+        """Payload for a pandas chunk."""
+
+    def write(self, payload):
+        self.file.write(payload)
+
+    def close(self):
+        self.file.close()
+
+
+class CsvChunkWriter(ChunkWriter):
+    """Appends chunks to a CSV file, writing the header once."""
+
+    def __init__(self, file_name, n_rows=None):
+        self.file = open(file_name, "wb")
+        self.file.write((",".join(columns) + "\n").encode("utf-8"))
+
+    @staticmethod
+    def encode_frame(df):
+        return df.to_csv(index=False, header=False).encode("utf-8")
+
+
+class NdjsonChunkWriter(ChunkWriter):
+    """Appends chunks to a newline-delimited JSON file, one record per line."""
 
-boxes_data = generate_boxes(10000)
-df = pd.DataFrame(boxes_data, columns=columns)
+    def __init__(self, file_name, n_rows=None):
+        self.file = open(file_name, "wb")
+
+    @staticmethod
+    def encode_frame(df):
+        return df.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8")
+
+
+class ParquetChunkWriter(ChunkWriter):
+    """Appends each chunk to a Parquet file as one row group (requires pyarrow)."""
+
+    def __init__(self, file_name, n_rows=None):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ Parquet output requires pyarrow: pip install pyarrow")
+        self.pq = pq
+        self.file_name = file_name
+        self.writer = None
+
+    @staticmethod
+    def encode_frame(df):
+        import pyarrow as pa
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    def write(self, payload):
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.file_name, payload.schema)
+        self.writer.write_table(payload)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class XlsxChunkWriter(ChunkWriter):
+    """Appends chunks to a write-only openpyxl workbook, which spills rows to disk."""
+
+    def __init__(self, file_name, n_rows=None):
+        from openpyxl import Workbook
+        self.file_name = file_name
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("Sheet1")
+        self.sheet.append(columns)
+
+    @staticmethod
+    def encode_frame(df):
+        return list(df.itertuples(index=False, name=None))
+
+    def write(self, payload):
+        for row in payload:
+            self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.file_name)
+
+
+class BoxcolChunkWriter(ChunkWriter):
+    """Fills a memory-mapped .boxcol file (see box_dataset.py) chunk by chunk."""
+
+    def __init__(self, file_name, n_rows=None):
+        self.writer = BoxcolWriter(file_name, n_rows, dictionaries)
+
+    @classmethod
+    def encode(cls, chunk):
+        return chunk
+
+    @staticmethod
+    def encode_frame(df):
+        return frame_to_columns(df, dictionaries)[0]
+
+    def write(self, payload):
+        self.writer.write(payload)
+
+    def close(self):
+        self.writer.close()
+
+
+chunk_writers = {
+    "csv": CsvChunkWriter,
+    "ndjson": NdjsonChunkWriter,
+    "parquet": ParquetChunkWriter,
+    "xlsx": XlsxChunkWriter,
+    "boxcol": BoxcolChunkWriter,
+}
+
+
+def format_from_file_name(file_name):
+    extension = file_name.rsplit(".", 1)[-1].lower()
+    return {"jsonl": "ndjson", "json": "ndjson"}.get(extension, extension)
+
+
+def _encode_chunk(writer_class, k, n, entropy, chunk_size, cuts=(), summarize=True, start_id=0):
+    """Encode chunk k, plus its first `cut` rows for every cut in `cuts`.
+
+    Returns a dict mapping a row count to the encoded payload of that many rows
+    and, with `summarize`, its DatasetSummary (see box_stats.py); None stands for
+    the whole chunk.
+    """
+    chunk = generate_chunk(k, n, entropy, chunk_size, start_id)
+    parts = {None: chunk}
+    for cut in cuts:
+        parts[cut] = {key: column[:cut] for key, column in chunk.items()}
+    return {
+        cut: (writer_class.encode(part),
+              DatasetSummary.of_chunk(part, dictionaries, k * chunk_size) if summarize else None)
+        for cut, part in parts.items()
+    }
 
-# Save and download from Google Colab
-file_name = "boxes_database.xlsx"
-df.to_excel(file_name, index=False)
 
-from google.colab import files
-files.download(file_name)
+def write_boxes_datasets(file_names, seed=None, chunk_size=CHUNK_SIZE, fmt=None, workers=1, summary=True,
+                         start_id=0):
+    """Write several dataset sizes as nested prefixes of one seeded stream.
+
+    `file_names` maps a row count to an output file. The stream is generated
+    once, up to the largest size, and every chunk is appended to each file that
+    still needs rows, so the smaller datasets are exactly the first rows of the
+    larger ones and the total cost is that of the largest size alone.
+
+    With `workers` > 1 the chunks are generated and encoded by a process pool
+    and written back in row order, so the files are bit-identical to the
+    single-process output for the same seed and chunk size. At most two chunks
+    per worker are in flight, which keeps memory bounded.
+
+    With `summary`, a summary sidecar with statistics and zone maps is written
+    next to every file (see box_stats.py).
+
+    Box IDs are numbered from `start_id`, so a dataset generated to be appended
+    to an existing database does not reuse the IDs already there.
+    """
+    sizes = sorted(file_names)
+    n = sizes[-1]
+    entropy = np.random.SeedSequence(seed).entropy
+    n_chunks = -(-n // chunk_size)
+    writers = {}
+    summaries = {size: DatasetSummary() for size in sizes}
+    try:
+        for size in sizes:
+            file_name = file_names[size]
+            writers[size] = chunk_writers[fmt or format_from_file_name(file_name)](file_name, size)
+        writer_classes = {type(writer) for writer in writers.values()}
+        if len(writer_classes) > 1:
+            raise ValueError("all nested datasets must use the same format")
+        writer_class = writer_classes.pop()
+
+        def chunk_args(k):
+            start = k * chunk_size
+            end = min(start + chunk_size, n)
+            cuts = tuple(size - start for size in sizes if start < size < end)
+            return writer_class, k, n, entropy, chunk_size, cuts, summary, start_id
+
+        def write(k, parts):
+            start = k * chunk_size
+            end = min(start + chunk_size, n)
+            for size, writer in writers.items():
+                if size > start:
+                    payload, part_summary = parts[None if size >= end else size - start]
+                    writer.write(payload)
+                    if summary:
+                        summaries[size].merge(part_summary)
+
+        if workers <= 1:
+            for k in range(n_chunks):
+                write(k, _encode_chunk(*chunk_args(k)))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for k in range(n_chunks):
+                    pending.append((k, pool.submit(_encode_chunk, *chunk_args(k))))
+                    if len(pending) >= 2 * workers:
+                        done, future = pending.popleft()
+                        write(done, future.result())
+                while pending:
+                    done, future = pending.popleft()
+                    write(done, future.result())
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    if summary:
+        for size in sizes:
+            write_summary_sidecar(file_names[size], summaries[size])
+
+
+def write_boxes_stream(file_name, n, seed=None, chunk_size=CHUNK_SIZE, fmt=None, workers=1, summary=True,
+                       start_id=0):
+    """Generate `n` boxes chunk by chunk and append each chunk to `file_name` as it is produced."""
+    write_boxes_datasets({n: file_name}, seed=seed, chunk_size=chunk_size, fmt=fmt, workers=workers,
+                         summary=summary, start_id=start_id)
+
+
+def benchmark(sizes=(10_000, 1_000_000, 10_000_000), loop_max_rows=1_000_000, seed=0):
+    """Print rows/second of generate_boxes() against generate_boxes_vectorized().
+
+    The loop engine keeps every record as a Python list, so sizes above
+    `loop_max_rows` are skipped for it to avoid exhausting memory.
+    """
+    print(f"{'Rows':>12} | {'Loop rows/s':>14} | {'Vectorized rows/s':>18} | {'Speedup':>8}")
+    for n in sizes:
+        loop_rate = None
+        if n <= loop_max_rows:
+            random.seed(seed)
+            start = time.perf_counter()
+            generate_boxes(n)
+            loop_rate = n / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        generate_boxes_vectorized(n, seed=seed)
+        vector_rate = n / (time.perf_counter() - start)
+
+        if loop_rate is None:
+            print(f"{n:>12,} | {'skipped':>14} | {vector_rate:>18,.0f} | {'-':>8}")
+        else:
+            print(f"{n:>12,} | {loop_rate:>14,.0f} | {vector_rate:>18,.0f} | {vector_rate / loop_rate:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a randomized box database.")
+    parser.add_argument("--rows", type=int, default=10000, help="number of records to generate")
+    parser.add_argument("--sizes", type=int, nargs="+", default=None,
+                        help="write several nested dataset sizes from one stream (vectorized engine); "
+                             "--output must contain {n}, e.g. boxes_database_{n}.csv")
+    parser.add_argument("--engine", choices=["loop", "vectorized"], default="loop",
+                        help="per-record Python loop or column-at-a-time numpy generation")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible datasets")
+    parser.add_argument("--start-id", type=int, default=0,
+                        help="number of the first Box ID (default 0, i.e. BX000000); use the row count of "
+                             "an existing database to generate boxes that can be appended to it")
+    parser.add_argument("--output", default="boxes_database.xlsx",
+                        help="output file; the extension selects the format unless --format is given")
+    parser.add_argument("--format", choices=sorted(chunk_writers), default=None, help="output format")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="rows generated and written per chunk with the vectorized engine")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes generating chunks in parallel with the vectorized engine (0 = all cores)")
+    parser.add_argument("--no-summary", action="store_true",
+                        help="do not write the <output>.summary.json statistics sidecar")
+    parser.add_argument("--no-download", action="store_true",
+                        help="skip the Google Colab download step even when running in Colab")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="compare rows/second of both engines instead of writing a file")
+    parser.add_argument("--loop-max-rows", type=int, default=1_000_000,
+                        help="largest benchmark size the loop engine is run at")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(loop_max_rows=args.loop_max_rows)
+        raise SystemExit
+
+    file_name = args.output
+    fmt = args.format or format_from_file_name(file_name)
+    if fmt not in chunk_writers:
+        parser.error(f"unsupported output format '{fmt}'")
+
+    if args.sizes:
+        if args.engine != "vectorized":
+            parser.error("--sizes requires --engine vectorized")
+        if "{n}" not in file_name:
+            parser.error("--output must contain {n} when --sizes is given")
+        file_names = {size: file_name.format(n=size) for size in args.sizes}
+        write_boxes_datasets(file_names, seed=args.seed, chunk_size=args.chunk_size, fmt=fmt,
+                             workers=args.workers or os.cpu_count(), summary=not args.no_summary,
+                             start_id=args.start_id)
+        for size in sorted(file_names):
+            print(f"✅ {size} boxes saved to '{file_names[size]}'")
+        raise SystemExit
+
+    if args.engine == "vectorized":
+        # Streaming mode: peak memory is one chunk, whatever the row count
+        workers = args.workers or os.cpu_count()
+        write_boxes_stream(file_name, args.rows, seed=args.seed, chunk_size=args.chunk_size, fmt=fmt,
+                           workers=workers, summary=not args.no_summary, start_id=args.start_id)
+    else:
+        random.seed(args.seed)
+        boxes_data = generate_boxes(args.rows, args.start_id)
+        df = pd.DataFrame(boxes_data, columns=columns)
+        if fmt == "xlsx":
+            df.to_excel(file_name, index=False)
+        else:
+            writer = chunk_writers[fmt](file_name, len(df))
+            writer.write(writer.encode_frame(df))
+            writer.close()
+        if not args.no_summary:
+            summary = DatasetSummary()
+            summary.update(*frame_to_columns(df, dictionaries))
+            write_summary_sidecar(file_name, summary)
+    print(f"✅ {args.rows} boxes saved to '{file_name}'")
+
+    # Download from Google Colab (skipped on a headless machine)
+    if not args.no_download:
+        try:
+            from google.colab import files
+        except ImportError:
+            files = None
+        if files is not None:
+            files.download(file_name)
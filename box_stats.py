@@ -0,0 +1,340 @@
+"""
+Box Dataset Statistics
+----------------------
+
+Single-pass, mergeable summary statistics for the box datasets.
+
+A DatasetStats accumulator is fed columnar chunks (see box_dataset.py) one at
+a time, so memory stays constant whatever the dataset size. Two accumulators
+built over different shards of a dataset merge into the statistics of the
+whole, which lets several processes share one file.
+
+📊 Collected per dataset:
+- row count, mean, min and max of every numeric column,
+- approximate quantiles from a mergeable relative-error sketch,
+- Yes-percentages of the Fragile/Stackable/Waterproof/Fire Retardant flags,
+- the same means and percentages broken down per Material.
+
+🗂️ Summary sidecars:
+The generator and the API importer store these statistics next to each
+dataset as `<dataset>.summary.json`, together with per-block min/max "zone
+maps" of the numeric columns. Stats_DBs.py reads a fresh sidecar instead of
+the rows.
+"""
+import json
+import math
+import os
+
+import numpy as np
+
+from box_dataset import flag_keys
+
+numeric_keys = [
+    "length", "width", "height", "thickness",
+    "ext_volume", "int_volume", "max_load",
+    "min_temp", "max_temp",
+]
+
+# Quantiles reported by DatasetStats.summary()
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error `accuracy` (DDSketch-style).
+
+    Values are counted in logarithmic buckets whose width grows with the
+    value, so every quantile estimate is within `accuracy` of a true value.
+    Sketches with the same accuracy merge by adding their bucket counts.
+    """
+
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _add_to(self, store, magnitudes):
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self._add_to(self.positive, values[values > 0])
+        self._add_to(self.negative, -values[values < 0])
+        self.zeros += int(np.count_nonzero(values == 0))
+        self.count += len(values)
+
+    def merge(self, other):
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+
+class _Moments:
+    """Count, sum, min and max of one numeric column."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def add(self, values):
+        if len(values):
+            self.count += len(values)
+            self.total += float(values.sum(dtype=np.float64))
+            self.minimum = min(self.minimum, float(values.min()))
+            self.maximum = max(self.maximum, float(values.max()))
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+
+class DatasetStats:
+    """Accumulates statistics over columnar chunks of one dataset."""
+
+    def __init__(self, accuracy=0.01):
+        self.rows = 0
+        self.moments = {key: _Moments() for key in numeric_keys}
+        self.sketches = {key: QuantileSketch(accuracy) for key in numeric_keys}
+        self.flags = {key: 0 for key in flag_keys}
+        # Per-material row count, column sums and flag counts, keyed by material name
+        self.materials = {}
+
+    def update(self, chunk, dictionaries):
+        """Add a columnar chunk whose Material codes index dictionaries["material"]."""
+        n = len(chunk["box_index"])
+        if not n:
+            return
+        self.rows += n
+        for key in numeric_keys:
+            values = np.asarray(chunk[key])
+            self.moments[key].add(values)
+            self.sketches[key].add(values)
+        for key in flag_keys:
+            self.flags[key] += int(np.count_nonzero(chunk[key]))
+
+        codes = np.asarray(chunk["material"], dtype=np.int64)
+        n_codes = len(dictionaries["material"])
+        counts = np.bincount(codes, minlength=n_codes)
+        sums = {key: np.bincount(codes, weights=chunk[key], minlength=n_codes) for key in numeric_keys}
+        flags = {key: np.bincount(codes, weights=chunk[key], minlength=n_codes) for key in flag_keys}
+        for code, name in enumerate(dictionaries["material"]):
+            if not counts[code]:
+                continue
+            group = self.materials.setdefault(name, {"rows": 0, "sums": dict.fromkeys(numeric_keys, 0.0),
+                                                     "flags": dict.fromkeys(flag_keys, 0)})
+            group["rows"] += int(counts[code])
+            for key in numeric_keys:
+                group["sums"][key] += float(sums[key][code])
+            for key in flag_keys:
+                group["flags"][key] += int(flags[key][code])
+
+    def merge(self, other):
+        """Fold the statistics of another shard of the same dataset into this one."""
+        self.rows += other.rows
+        for key in numeric_keys:
+            self.moments[key].merge(other.moments[key])
+            self.sketches[key].merge(other.sketches[key])
+        for key in flag_keys:
+            self.flags[key] += other.flags[key]
+        for name, other_group in other.materials.items():
+            group = self.materials.setdefault(name, {"rows": 0, "sums": dict.fromkeys(numeric_keys, 0.0),
+                                                     "flags": dict.fromkeys(flag_keys, 0)})
+            group["rows"] += other_group["rows"]
+            for key in numeric_keys:
+                group["sums"][key] += other_group["sums"][key]
+            for key in flag_keys:
+                group["flags"][key] += other_group["flags"][key]
+        return self
+
+    def summary(self):
+        """The accumulated statistics as plain, JSON-serializable values."""
+        rows = self.rows or math.nan
+        return {
+            "items": self.rows,
+            "columns": {
+                key: {
+                    "mean": self.moments[key].mean,
+                    "min": self.moments[key].minimum if self.rows else None,
+                    "max": self.moments[key].maximum if self.rows else None,
+                    "quantiles": {str(q): self.sketches[key].quantile(q) for q in QUANTILES},
+                }
+                for key in numeric_keys
+            },
+            "flags_pct": {key: self.flags[key] / rows * 100 for key in flag_keys},
+            "materials": {
+                name: {
+                    "items": group["rows"],
+                    "means": {key: group["sums"][key] / group["rows"] for key in numeric_keys},
+                    "flags_pct": {key: group["flags"][key] / group["rows"] * 100 for key in flag_keys},
+                }
+                for name, group in sorted(self.materials.items())
+            },
+        }
+
+
+# --- Summary sidecars ------------------------------------------------------
+# A small JSON file next to a dataset ("<dataset>.summary.json") holding the
+# DatasetStats summary plus per-block min/max "zone maps" of the numeric
+# columns, so dataset-level numbers need not read the rows.
+ZONE_ROWS = 4096
+SIDECAR_SUFFIX = ".summary.json"
+
+
+class ZoneMaps:
+    """Per-block min/max of the numeric columns; block b covers rows [b * block_rows, (b + 1) * block_rows)."""
+
+    def __init__(self, block_rows=ZONE_ROWS):
+        self.block_rows = block_rows
+        self.first_block = 0
+        self.mins = {key: [] for key in numeric_keys}
+        self.maxs = {key: [] for key in numeric_keys}
+
+    @classmethod
+    def of_chunk(cls, chunk, start, block_rows=ZONE_ROWS):
+        """Zone maps of a chunk whose first row is row `start` of the dataset.
+
+        The first and last blocks of the chunk may be partial; merge() combines
+        them with the neighbouring chunks.
+        """
+        zones = cls(block_rows)
+        n = len(chunk["box_index"])
+        if not n:
+            zones.first_block = start // block_rows
+            return zones
+        zones.first_block = start // block_rows
+        # Segment boundaries at the global block edges that fall inside the chunk
+        edges = np.arange((zones.first_block + 1) * block_rows, start + n, block_rows) - start
+        starts = np.concatenate([[0], edges])
+        for key in numeric_keys:
+            values = np.asarray(chunk[key])
+            zones.mins[key] = np.minimum.reduceat(values, starts).tolist()
+            zones.maxs[key] = np.maximum.reduceat(values, starts).tolist()
+        return zones
+
+    def __len__(self):
+        return len(self.mins[numeric_keys[0]])
+
+    def merge(self, other):
+        """Append the zone maps of the rows directly following these ones."""
+        if not len(other):
+            return self
+        if not len(self):
+            self.first_block = other.first_block
+            for key in numeric_keys:
+                self.mins[key] = list(other.mins[key])
+                self.maxs[key] = list(other.maxs[key])
+            return self
+        end_block = self.first_block + len(self)
+        if other.first_block == end_block - 1:
+            # Both sides hold part of the same block
+            for key in numeric_keys:
+                self.mins[key][-1] = min(self.mins[key][-1], other.mins[key][0])
+                self.maxs[key][-1] = max(self.maxs[key][-1], other.maxs[key][0])
+                self.mins[key].extend(other.mins[key][1:])
+                self.maxs[key].extend(other.maxs[key][1:])
+        elif other.first_block == end_block:
+            for key in numeric_keys:
+                self.mins[key].extend(other.mins[key])
+                self.maxs[key].extend(other.maxs[key])
+        else:
+            raise ValueError("zone maps can only be merged in row order")
+        return self
+
+    def to_dict(self):
+        return {
+            "block_rows": self.block_rows,
+            "columns": {key: {"min": self.mins[key], "max": self.maxs[key]} for key in numeric_keys},
+        }
+
+
+class DatasetSummary:
+    """DatasetStats plus ZoneMaps, built chunk by chunk in row order."""
+
+    def __init__(self, block_rows=ZONE_ROWS):
+        self.stats = DatasetStats()
+        self.zones = ZoneMaps(block_rows)
+
+    @classmethod
+    def of_chunk(cls, chunk, dictionaries, start, block_rows=ZONE_ROWS):
+        summary = cls(block_rows)
+        summary.stats.update(chunk, dictionaries)
+        summary.zones = ZoneMaps.of_chunk(chunk, start, block_rows)
+        return summary
+
+    def update(self, chunk, dictionaries):
+        """Add the chunk of rows that directly follows the rows seen so far."""
+        self.merge(DatasetSummary.of_chunk(chunk, dictionaries, self.stats.rows, self.zones.block_rows))
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.zones.merge(other.zones)
+        return self
+
+    def to_dict(self):
+        return {"stats": self.stats.summary(), "zone_maps": self.zones.to_dict()}
+
+
+def sidecar_path(dataset_file):
+    return dataset_file + SIDECAR_SUFFIX
+
+
+def _source_signature(dataset_file):
+    stat = os.stat(dataset_file)
+    return {"file": os.path.basename(dataset_file), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def write_summary_sidecar(dataset_file, summary):
+    """Write `summary` (a DatasetSummary) next to `dataset_file`, stamped with the file's size and mtime."""
+    document = {"source": _source_signature(dataset_file), **summary.to_dict()}
+    with open(sidecar_path(dataset_file), "w") as f:
+        json.dump(document, f, separators=(",", ":"))
+    return sidecar_path(dataset_file)
+
+
+def read_summary_sidecar(dataset_file):
+    """The sidecar of `dataset_file` as a dict, or None when it is missing or stale."""
+    try:
+        with open(sidecar_path(dataset_file)) as f:
+            document = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if document.get("source") != _source_signature(dataset_file):
+        return None
+    return document
+
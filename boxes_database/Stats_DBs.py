@@ -1,46 +1,152 @@
-# 📦 STEP 1: Install and import dependencies
-import pandas as pd
+# 📦 STEP 1: Import dependencies
+import argparse
+import glob
+import json
 import os
-from google.colab import files
-from IPython.display import display
-
-# 📂 STEP 2: Upload all 7 datasets
-print("Upload your Excel files (e.g., boxes_0500.xlsx to boxes_100000.xlsx):")
-uploaded = files.upload()
-
-# 🧠 STEP 3: Process each file and collect stats
-summary_list = []
-
-for filename in uploaded.keys():
-    print(f"Processing: {filename}")
-    df = pd.read_excel(filename)
-
-    # Normalize binary flags
-    df['Fragile'] = df['Fragile'].map({'Yes': 1, 'No': 0})
-    df['Stackable'] = df['Stackable'].map({'Yes': 1, 'No': 0})
-
-    # Calculate summary statistics
-    stats = {
-        "Dataset": filename,
-        "Items": len(df),
-        "Avg Length (cm)": df['Length (cm)'].mean(),
-        "Avg Width (cm)": df['Width (cm)'].mean(),
-        "Avg Height (cm)": df['Height (cm)'].mean(),
-        "Avg Max Load (kg)": df['Max Load Capacity (kg)'].mean(),
-        "Fragile %": df['Fragile'].mean() * 100,
-        "Stackable %": df['Stackable'].mean() * 100
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+# Shared dataset loader and statistics engine (repository root)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from box_dataset import DATASET_ERRORS, frame_to_columns, iter_frames, open_boxcol, open_boxes
+from box_stats import DatasetSummary, read_summary_sidecar, write_summary_sidecar
+
+SHARD_ROWS = 250_000   # rows per parallel task
+CHUNK_ROWS = 50_000    # rows in memory at a time within a task
+
+
+def shard_stats(boxcol_path, start, stop, chunk_rows=CHUNK_ROWS):
+    """DatasetSummary of rows [start, stop) of a .boxcol file, read chunk by chunk."""
+    dataset = open_boxcol(boxcol_path)
+    summary = DatasetSummary()
+    for chunk_start in range(start, stop, chunk_rows):
+        chunk = dataset.columns(chunk_start, min(chunk_start + chunk_rows, stop))
+        summary.merge(DatasetSummary.of_chunk(chunk, dataset.dictionaries, chunk_start))
+    return summary
+
+
+def frame_stats(filename, chunk_rows=CHUNK_ROWS):
+    """DatasetSummary of a dataset that cannot be stored as .boxcol, read chunk by chunk."""
+    summary = DatasetSummary()
+    dictionaries = None
+    for df in iter_frames(filename, chunk_rows):
+        boxes, dictionaries = frame_to_columns(df, dictionaries)
+        summary.update(boxes, dictionaries)
+    return summary
+
+
+def prepare_dataset(filename, chunk_rows=CHUNK_ROWS):
+    """Worker task: the .boxcol path and row count of a dataset, converting it if needed.
+
+    Datasets without a .boxcol form are summarized right away, so the
+    DatasetSummary is returned instead.
+    """
+    # Excel files are converted once to a memory-mapped sidecar (see box_dataset.py)
+    dataset = open_boxes(filename)
+    if dataset is None:
+        return frame_stats(filename, chunk_rows)
+    return dataset.file_name, len(dataset)
+
+
+def collect_stats(filenames, workers=None, shard_rows=SHARD_ROWS, chunk_rows=CHUNK_ROWS):
+    """Statistics summary of every file.
+
+    A fresh `<dataset>.summary.json` sidecar is used as is. Other files are
+    converted in the worker pool, one task per dataset, then split into
+    shards processed in parallel, and a sidecar is written for them.
+    """
+    results = {}
+    computed = {}
+    shards = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        conversions = {}
+        for filename in filenames:
+            sidecar = read_summary_sidecar(filename)
+            if sidecar is not None:
+                results[filename] = sidecar["stats"]
+                continue
+            conversions[pool.submit(prepare_dataset, filename, chunk_rows)] = filename
+        # Shard a dataset as soon as its conversion is done, while the others still convert
+        for task in as_completed(conversions):
+            filename = conversions[task]
+            try:
+                prepared = task.result()
+            except DATASET_ERRORS as error:
+                print(f"⚠️ Skipping '{filename}': {error}")
+                continue
+            if isinstance(prepared, DatasetSummary):
+                computed[filename] = prepared
+                continue
+            boxcol_path, rows = prepared
+            computed[filename] = DatasetSummary()
+            shards[filename] = [
+                pool.submit(shard_stats, boxcol_path, start, min(start + shard_rows, rows), chunk_rows)
+                for start in range(0, rows, shard_rows)
+            ]
+        # Zone maps merge in row order, so collect each dataset's shards in order
+        for filename, tasks in shards.items():
+            try:
+                for task in tasks:
+                    computed[filename].merge(task.result())
+            except DATASET_ERRORS as error:
+                print(f"⚠️ Skipping '{filename}': {error}")
+                computed.pop(filename)
+
+    for filename, summary in computed.items():
+        results[filename] = summary.stats.summary()
+        try:
+            write_summary_sidecar(filename, summary)
+        except OSError:  # read-only dataset folder; the statistics are still reported
+            pass
+    return {filename: results[filename] for filename in filenames if filename in results}
+
+
+# 🧠 STEP 2: Summary table with the same columns as before
+def summary_row(filename, summary):
+    return {
+        "Dataset": os.path.basename(filename),
+        "Items": summary["items"],
+        "Avg Length (cm)": summary["columns"]["length"]["mean"],
+        "Avg Width (cm)": summary["columns"]["width"]["mean"],
+        "Avg Height (cm)": summary["columns"]["height"]["mean"],
+        "Avg Max Load (kg)": summary["columns"]["max_load"]["mean"],
+        "Fragile %": summary["flags_pct"]["fragile"],
+        "Stackable %": summary["flags_pct"]["stackable"],
     }
 
-    summary_list.append(stats)
 
-# 🧾 STEP 4: Create a DataFrame with the results
-summary_df = pd.DataFrame(summary_list)
-summary_df = summary_df.sort_values(by="Items").round(2)
+if __name__ == "__main__":
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Summary statistics across MixedPalletBoxes datasets.")
+    parser.add_argument("datasets", nargs="*",
+                        help="dataset files (.xlsx, .csv, .parquet, .ndjson or .boxcol); "
+                             "default: the Excel files in this folder")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS, help="rows per parallel task")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows held in memory per task")
+    parser.add_argument("--output", default="MixedPalletBoxes_Summary.csv", help="summary CSV file")
+    parser.add_argument("--details", default="MixedPalletBoxes_Details.json",
+                        help="JSON file with min/max, quantiles and per-material breakdowns")
+    args = parser.parse_args()
+
+    # 📂 STEP 3: Collect the datasets and process them in parallel
+    filenames = args.datasets or sorted(glob.glob(os.path.join(here, "*.xlsx")))
+    for filename in filenames:
+        print(f"Processing: {filename}")
+    results = collect_stats(filenames, workers=args.workers, shard_rows=args.shard_rows, chunk_rows=args.chunk_rows)
+
+    # 🧾 STEP 4: Create a DataFrame with the results
+    summary_df = pd.DataFrame([summary_row(filename, summary) for filename, summary in results.items()])
+    summary_df = summary_df.sort_values(by="Items").round(2)
 
-# 🖨️ Display summary
-print("\nSummary Statistics Across Datasets:")
-display(summary_df)
+    # 🖨️ Display summary
+    print("\nSummary Statistics Across Datasets:")
+    print(summary_df.to_string(index=False))
 
-# 💾 STEP 5: Save and export as CSV (optional)
-summary_df.to_csv("MixedPalletBoxes_Summary.csv", index=False)
-files.download("MixedPalletBoxes_Summary.csv")
+    # 💾 STEP 5: Save the summary as CSV and the detailed statistics as JSON
+    summary_df.to_csv(args.output, index=False)
+    with open(args.details, "w") as f:
+        json.dump({os.path.basename(name): summary for name, summary in results.items()}, f, indent=2)
+    print(f"\n✅ Summary saved to '{args.output}', details to '{args.details}'")
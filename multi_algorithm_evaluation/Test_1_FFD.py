@@ -1,74 +1,145 @@
-import pandas as pd
 import time
 
+from box_arrays import BoxArrays
+
 # --- Step 0: Start Timer ---
 start_time = time.time()
 
 # --- Step 1: Load Excel File ---
 file_path = "/content/boxes_100.xlsx"  # Ensure file is uploaded in Colab
-df = pd.read_excel(file_path)
-
-# Rename columns for convenience
-df = df.rename(columns={
-    'Length (cm)': 'length_cm',
-    'Width (cm)': 'width_cm',
-    'Height (cm)': 'height_cm',
-    'External Volume (L)': 'volume_L',
-    'Max Load Capacity (kg)': 'max_load_kg',
-    'Fragile': 'fragile',
-    'Stackable': 'stackable',
-    'Box ID': 'box_id'
-})
+boxes = BoxArrays.load(file_path)
 
 # --- Step 2: Validation ---
-df['valid'] = (
-    (df['length_cm'] > 0) &
-    (df['width_cm'] > 0) &
-    (df['height_cm'] > 0) &
-    (df['volume_L'] > 0)
-)
-
-if not df['valid'].all():
+valid = boxes.valid()
+
+if not valid.all():
     print("❌ Validation failed: some boxes have invalid dimensions or volume.")
-    print(df[~df['valid']])
+    print(boxes.frame(~valid))
 else:
     print("✅ All boxes passed basic validation.")
 
-print(f"\n📦 Total boxes: {len(df)}")
-print(f"📏 Total volume: {df['volume_L'].sum():,.2f} L")
+print(f"\n📦 Total boxes: {len(boxes)}")
+print(f"📏 Total volume: {boxes.volume.sum():,.2f} L")
 
-# --- Step 3: First-Fit Decreasing (FFD) Palletizing ---
+# --- Step 3: First-Fit / Best-Fit Decreasing Palletizing ---
 PALLET_CAPACITY_L = 1000  # 1 m³ per pallet = 1000 liters
+PACKING_MODE = "ffd"  # "ffd" first fit, "bfd" best fit, "nfd" next fit (only the last pallet stays open)
+
+
+class FirstFitTree:
+    """Tournament tree over the free volume of pallets 0, 1, 2, ... (unopened pallets are empty).
+
+    Every inner node holds the largest free volume below it, so the first
+    pallet a box fits on is found by walking down from the root, always into
+    the left child if it has room: O(log pallets) per box instead of scanning
+    all open pallets. The tree doubles in size when all its pallets are open.
+    """
+
+    def __init__(self, capacity, size=64):
+        self.capacity = capacity
+        self.size = size
+        self.free = [capacity] * (2 * size)
+
+    def first_fit(self, volume):
+        """Index of the first pallet with at least `volume` free, or None."""
+        free = self.free
+        if free[1] < volume:
+            return None
+        node = 1
+        while node < self.size:
+            node *= 2
+            if free[node] < volume:
+                node += 1
+        return node - self.size
+
+    def update(self, pallet, free_volume):
+        while pallet >= self.size:
+            leaves = self.free[self.size:] + [self.capacity] * self.size
+            self.size *= 2
+            self.free = [0] * self.size + leaves
+            for node in range(self.size - 1, 0, -1):
+                self.free[node] = max(self.free[2 * node], self.free[2 * node + 1])
+        free = self.free
+        node = pallet + self.size
+        free[node] = free_volume
+        while node > 1:
+            node //= 2
+            largest = max(free[2 * node], free[2 * node + 1])
+            if free[node] == largest:
+                break  # nothing changes further up
+            free[node] = largest
+
 
 # Sort boxes by descending volume
-boxes_sorted = df.sort_values(by='volume_L', ascending=False).reset_index(drop=True)
+order = boxes.sorted_by('volume')
+volumes = boxes.volume.tolist()
 
+# Pallets are lists of box ids
 pallets = []
-current_pallet = []
-current_volume = 0
-
-for idx, row in boxes_sorted.iterrows():
-    box_vol = row['volume_L']
-    if current_volume + box_vol <= PALLET_CAPACITY_L:
-        current_pallet.append(row)
-        current_volume += box_vol
-    else:
-        pallets.append(pd.DataFrame(current_pallet))
-        current_pallet = [row]
-        current_volume = box_vol
-
-# Add the final pallet
-if current_pallet:
-    pallets.append(pd.DataFrame(current_pallet))
+used = []  # volume used per pallet
+
+if PACKING_MODE == "ffd":
+    # Each box goes on the first (oldest) pallet with room for it
+    tree = FirstFitTree(PALLET_CAPACITY_L)
+    for box in order.tolist():
+        box_vol = volumes[box]
+        i = tree.first_fit(box_vol)
+        if i is None:  # larger than a pallet: it gets a pallet of its own
+            i = len(pallets)
+        if i == len(pallets):
+            pallets.append([])
+            used.append(0)
+        pallets[i].append(box)
+        used[i] += box_vol
+        tree.update(i, PALLET_CAPACITY_L - used[i])
+
+elif PACKING_MODE == "bfd":
+    # Each box goes on the open pallet it fills best (least free volume left)
+    from sortedcontainers import SortedList
+
+    open_pallets = SortedList()  # (free volume, pallet index)
+    for box in order.tolist():
+        box_vol = volumes[box]
+        k = open_pallets.bisect_left((box_vol, -1))
+        if k < len(open_pallets):
+            i = open_pallets.pop(k)[1]
+        else:
+            i = len(pallets)
+            pallets.append([])
+            used.append(0)
+        pallets[i].append(box)
+        used[i] += box_vol
+        if used[i] < PALLET_CAPACITY_L:
+            open_pallets.add((PALLET_CAPACITY_L - used[i], i))
+
+else:
+    # Next fit: a new pallet is started whenever the current one is too full
+    current_pallet = []
+    current_volume = 0
+
+    for box in order.tolist():
+        box_vol = volumes[box]
+        if current_volume + box_vol <= PALLET_CAPACITY_L:
+            current_pallet.append(box)
+            current_volume += box_vol
+        else:
+            pallets.append(current_pallet)
+            current_pallet = [box]
+            current_volume = box_vol
+
+    # Add the final pallet
+    if current_pallet:
+        pallets.append(current_pallet)
 
 # --- Step 4: Per-Pallet Report ---
-print(f"\n📦 Boxes packed into {len(pallets)} pallet(s) using First-Fit Decreasing:\n")
+mode_names = {"ffd": "First-Fit Decreasing", "bfd": "Best-Fit Decreasing", "nfd": "Next-Fit Decreasing"}
+print(f"\n📦 Boxes packed into {len(pallets)} pallet(s) using {mode_names[PACKING_MODE]}:\n")
 
 utilizations = []
 box_counts = []
 
 for i, p in enumerate(pallets):
-    vol_used = p['volume_L'].sum()
+    vol_used = boxes.volume[p].sum()
     utilizations.append(vol_used / PALLET_CAPACITY_L)
     box_counts.append(len(p))
     print(f"  🪵 Pallet {i+1}: {len(p)} boxes, {vol_used:.2f} L used ({vol_used / PALLET_CAPACITY_L:.1%})")
@@ -85,4 +156,4 @@ print(f"⏱️ Runtime: {runtime:.3f} seconds")
 
 # --- Optional: Show first few boxes from the first pallet ---
 print("\n🔍 First pallet preview:")
-print(pallets[0][['box_id', 'length_cm', 'width_cm', 'height_cm', 'volume_L', 'fragile']].head())
+print(boxes.frame(pallets[0][:5]))
@@ -1,7 +1,12 @@
-import pandas as pd
+import numpy as np
 import time
 import sys
 import platform
+import math
+
+from sortedcontainers import SortedList
+
+from box_arrays import BoxArrays
 
 # --- Pallet dimensions (cm) ---
 PALLET_LENGTH = 120  # 1.2 meters
@@ -10,110 +15,231 @@ PALLET_HEIGHT = 85   # 0.85 meters
 
 # --- Load your box dataset ---
 file_path = "/content/boxes_100.xlsx"  # Upload your file to Colab
-df = pd.read_excel(file_path)
-
-# Rename columns for convenience
-df = df.rename(columns={
-    'Box ID': 'box_id',
-    'Length (cm)': 'length_cm',
-    'Width (cm)': 'width_cm',
-    'Height (cm)': 'height_cm',
-    'External Volume (L)': 'volume_L',
-    'Fragile': 'fragile'
-})
+boxes = BoxArrays.load(file_path)
 
 # Basic validation
-valid = (
-    (df['length_cm'] > 0) &
-    (df['width_cm'] > 0) &
-    (df['height_cm'] > 0)
-)
-df = df[valid].reset_index(drop=True)
-print(f"✅ Loaded {len(df)} valid boxes")
+valid = (boxes.length > 0) & (boxes.width > 0) & (boxes.height > 0)
+boxes = boxes.take(np.flatnonzero(valid))
+print(f"✅ Loaded {len(boxes)} valid boxes")
 
 # Sort boxes by volume descending (largest first)
-df = df.sort_values(by='volume_L', ascending=False).reset_index(drop=True)
+order = boxes.sorted_by('volume')
+# (length, width, height) of every box id
+sizes = list(zip(boxes.length.tolist(), boxes.width.tolist(), boxes.height.tolist()))
 
 # --- Extreme Point Heuristic Implementation ---
+AABB_MIN_TESTS = 1024  # (extreme points x placed boxes) from which overlaps are tested in one NumPy pass
+SUMMARY_ROOMS = 8  # free extents kept per pallet summary
+
+
+class ExtremePoints:
+    """The extreme points (x, y, z) of a pallet in bottom-left-back order: by z, then y, then x.
+
+    Kept in a SortedList of (z, y, x) keys, so adding, removing and finding a
+    point is O(log n) and the points in a height range are found without
+    scanning the others.
+    """
+
+    def __init__(self):
+        self.keys = SortedList([(0, 0, 0)])  # Start with origin point
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return ((x, y, z) for z, y, x in self.keys)
+
+    def __contains__(self, point):
+        x, y, z = point
+        return (z, y, x) in self.keys
+
+    def add(self, point):
+        x, y, z = point
+        self.keys.add((z, y, x))
+
+    def up_to(self, max_z):
+        """The points with z <= max_z, in order."""
+        return [(x, y, z) for z, y, x in self.keys.irange(maximum=(max_z, math.inf))]
+
+    def remove_inside(self, x, y, z, length, width, height):
+        """Remove the points inside the box at (x, y, z) with that length, width and height (far faces excluded)."""
+        inside = [key for key in self.keys.irange((z,), (z + height,), inclusive=(True, False))
+                  if x <= key[2] < x + length and y <= key[1] < y + width]
+        for key in inside:
+            self.keys.remove(key)
+
+
 class Pallet:
     def __init__(self, length, width, height):
         self.length = length
         self.width = width
         self.height = height
-        self.boxes = []
-        self.extreme_points = [(0, 0, 0)]  # Start with origin point
+        self.boxes = []      # ids of the placed boxes
+        self.positions = []  # (x, y, z) of each placed box
+        self.placed = []     # (x, y, z, length, width, height) of each placed box
+        self.corners = None  # (low, high) corners of the placed boxes as (3, n) arrays, built on demand
+        self.extreme_points = ExtremePoints()
+        self.free_volume = length * width * height  # cm³
+        self.rooms = [(length, width, height)]      # free extents, see update_summary()
 
-    def can_place(self, box, point):
+    def can_place(self, size, point):
         x, y, z = point
+        length, width, height = size
         # Check if box fits within pallet bounds
-        if (x + box['length_cm'] > self.length or
-            y + box['width_cm'] > self.width or
-            z + box['height_cm'] > self.height):
+        if (x + length > self.length or
+            y + width > self.width or
+            z + height > self.height):
             return False
 
         # Check overlap with already placed boxes
-        for b in self.boxes:
+        for bx, by, bz, bl, bw, bh in self.placed:
             if not (
-                x + box['length_cm'] <= b['pos_x'] or
-                b['pos_x'] + b['length_cm'] <= x or
-                y + box['width_cm'] <= b['pos_y'] or
-                b['pos_y'] + b['width_cm'] <= y or
-                z + box['height_cm'] <= b['pos_z'] or
-                b['pos_z'] + b['height_cm'] <= z
+                x + length <= bx or
+                bx + bl <= x or
+                y + width <= by or
+                by + bw <= y or
+                z + height <= bz or
+                bz + bh <= z
             ):
                 return False
         return True
 
-    def place_box(self, box):
-        # Try all extreme points to place the box
-        for i, point in enumerate(self.extreme_points):
-            if self.can_place(box, point):
-                # Place the box here
-                placed_box = box.copy()
-                placed_box['pos_x'], placed_box['pos_y'], placed_box['pos_z'] = point
-                self.boxes.append(placed_box)
-
-                # Update extreme points:
-                # Remove current point and add new ones at the top and sides of the placed box
-                del self.extreme_points[i]
-
-                new_points = [
-                    (point[0] + box['length_cm'], point[1], point[2]),
-                    (point[0], point[1] + box['width_cm'], point[2]),
-                    (point[0], point[1], point[2] + box['height_cm'])
-                ]
-
-                for np in new_points:
-                    if np not in self.extreme_points and self.is_within_bounds(np):
-                        self.extreme_points.append(np)
-                return True
-        return False
-
-    def is_within_bounds(self, point):
+    def first_fit(self, size):
+        """The first extreme point (bottom-left-back order) where a box of `size` fits, or None."""
+        length, width, height = size
+        max_x, max_y = self.length - length, self.width - width
+        # Only the points where the box stays within the pallet bounds need an overlap test
+        candidates = [(x, y, z) for x, y, z in self.extreme_points.up_to(self.height - height)
+                      if x <= max_x and y <= max_y]
+        if len(candidates) * len(self.placed) < AABB_MIN_TESTS:
+            for point in candidates:
+                if self.can_place(size, point):
+                    return point
+            return None
+
+        # Busy pallet: test all candidate points against all placed boxes at once.
+        # Two axis-aligned boxes overlap when their extents overlap on all three axes.
+        if self.corners is None:
+            placed = np.array(self.placed).T
+            self.corners = (placed[:3], placed[:3] + placed[3:])
+        box_low, box_high = self.corners
+        low = np.array(candidates).T
+        overlap = np.ones((len(candidates), len(self.placed)), dtype=bool)
+        for axis in range(3):
+            overlap &= low[axis][:, None] < box_high[axis]
+            overlap &= box_low[axis] < (low[axis] + size[axis])[:, None]
+        free = np.flatnonzero(~overlap.any(axis=1))
+        return candidates[free[0]] if len(free) else None
+
+    def place_box(self, box, size):
+        # Place the box (id `box`, dimensions `size`) at the first extreme point where it fits
+        point = self.first_fit(size)
+        if point is None:
+            return False
+        self.boxes.append(box)
+        self.positions.append(point)
+        self.placed.append((*point, *size))
+        self.corners = None
+
+        # Update extreme points:
+        # Remove the points the box now covers (including its own) and add new ones at the
+        # top and sides of the placed box
+        self.extreme_points.remove_inside(*point, *size)
+
+        new_points = [
+            (point[0] + size[0], point[1], point[2]),
+            (point[0], point[1] + size[1], point[2]),
+            (point[0], point[1], point[2] + size[2])
+        ]
+
+        for new_point in new_points:
+            if new_point not in self.extreme_points and self.is_usable(new_point):
+                self.extreme_points.add(new_point)
+        self.update_summary(size)
+        return True
+
+    def update_summary(self, size):
+        """Update the free volume and the free extents after placing a box of `size`.
+
+        A box only goes where it stays inside the pallet, so it needs an
+        extreme point (x, y, z) whose free extent (length - x, width - y,
+        height - z) is at least its size on every axis. Only the extents not
+        covered by a larger one are kept. If there are more than SUMMARY_ROOMS
+        of them, they are merged into the largest free length, width and
+        height (above the lowest extreme point), which is looser but still
+        never rules out a pallet the box fits on.
+        """
+        self.free_volume -= size[0] * size[1] * size[2]
+        rooms = sorted({(self.length - x, self.width - y, self.height - z) for x, y, z in self.extreme_points},
+                       reverse=True)
+        kept = []
+        for length, width, height in rooms:  # larger first, so a room can only be covered by one already kept
+            for kept_length, kept_width, kept_height in kept:
+                if kept_length >= length and kept_width >= width and kept_height >= height:
+                    break
+            else:
+                if len(kept) == SUMMARY_ROOMS:
+                    kept = [tuple(map(max, zip(*rooms)))]
+                    break
+                kept.append((length, width, height))
+        self.rooms = kept
+
+    def is_usable(self, point):
+        """Whether a box could ever be placed at `point`.
+
+        Not on the far walls or top of the pallet (no room left), and not inside a
+        placed box.
+        """
         x, y, z = point
-        return x <= self.length and y <= self.width and z <= self.height
+        if x >= self.length or y >= self.width or z >= self.height:
+            return False
+        for bx, by, bz, bl, bw, bh in self.placed:
+            if bx <= x < bx + bl and by <= y < by + bw and bz <= z < bz + bh:
+                return False
+        return True
 
 # --- Pack boxes into pallets ---
 start_time = time.time()
 pallets = []
+# Pallet summaries, one row per pallet: free volume and free extents (padded with -1).
+# Pallets whose summary rules the box out are skipped without trying any extreme point.
+free_volumes = np.zeros(len(order), dtype=np.int64)
+free_rooms = np.full((len(order), SUMMARY_ROOMS, 3), -1, dtype=np.int64)
+pallet_checks = 0  # pallets the packer would have tried one by one
+pruned = 0         # of those, skipped on their summary
+
+
+def store_summary(i, pallet):
+    free_volumes[i] = pallet.free_volume
+    free_rooms[i] = -1
+    free_rooms[i, :len(pallet.rooms)] = pallet.rooms
+
 
-for idx, box in df.iterrows():
-    placed = False
-    for pallet in pallets:
-        if pallet.place_box(box):
-            placed = True
+for box in order.tolist():
+    length, width, height = size = sizes[box]
+    n = len(pallets)
+    hopeful = np.flatnonzero((free_volumes[:n] >= length * width * height) &
+                             (free_rooms[:n] >= size).all(axis=2).any(axis=1))
+    for k, i in enumerate(hopeful.tolist()):
+        if pallets[i].place_box(box, size):
+            store_summary(i, pallets[i])
+            pallet_checks += i + 1
+            pruned += i - k
             break
-    if not placed:
+    else:
+        pallet_checks += n
+        pruned += n - len(hopeful)
         # Create new pallet
         p = Pallet(PALLET_LENGTH, PALLET_WIDTH, PALLET_HEIGHT)
-        if not p.place_box(box):
-            raise ValueError(f"Box {box['box_id']} too large to fit in an empty pallet")
+        if not p.place_box(box, size):
+            raise ValueError(f"Box {boxes.box_ids([box])[0]} too large to fit in an empty pallet")
+        store_summary(n, p)
         pallets.append(p)
 
 end_time = time.time()
 
 # --- Reporting ---
-print(f"\n📦 Packed {len(df)} boxes into {len(pallets)} pallet(s) using Extreme Point heuristic.\n")
+print(f"\n📦 Packed {len(boxes)} boxes into {len(pallets)} pallet(s) using Extreme Point heuristic.\n")
 
 utilizations = []
 box_counts = []
@@ -122,7 +248,7 @@ box_counts = []
 pallet_vol = PALLET_LENGTH * PALLET_WIDTH * PALLET_HEIGHT / 1000  # 1020 liters
 
 for i, pallet in enumerate(pallets):
-    vol_used = sum([b['volume_L'] for b in pallet.boxes])
+    vol_used = boxes.volume[pallet.boxes].sum()
     utilization = vol_used / pallet_vol
     utilizations.append(utilization)
     box_counts.append(len(pallet.boxes))
@@ -132,12 +258,14 @@ print("\n📊 Summary:")
 print(f"🔢 Number of pallets used: {len(pallets)}")
 print(f"📦 Average pallet volume utilization: {sum(utilizations) / len(utilizations) * 100:.2f}%")
 print(f"📦 Average box count per pallet: {sum(box_counts) / len(box_counts):.2f}")
+print(f"✂️ Pallets pruned by summary: {pruned:,} of {pallet_checks:,} checks ({pruned / max(pallet_checks, 1):.1%})")
 print(f"⏱️ Runtime: {end_time - start_time:.3f} seconds")
 
 # --- Preview first pallet's boxes ---
 print("\n🔍 First pallet preview:")
-first_pallet_df = pd.DataFrame(pallets[0].boxes)
-print(first_pallet_df[['box_id', 'length_cm', 'width_cm', 'height_cm', 'volume_L', 'pos_x', 'pos_y', 'pos_z']].head())
+first_pallet_df = boxes.frame(pallets[0].boxes[:5]).drop(columns='fragile')
+first_pallet_df[['pos_x', 'pos_y', 'pos_z']] = pallets[0].positions[:5]
+print(first_pallet_df)
 
 # --- Environment info ---
 print("\n🖥️ Environment Information:")
@@ -1,11 +1,12 @@
 #!pip install py3dbp
 
-import pandas as pd
 import time
 import platform
 import sys
 from py3dbp import Packer, Bin, Item
 
+from box_arrays import BoxArrays
+
 # --- Configuration ---
 FILE_PATH = "/content/boxes_100.xlsx"  # Upload your Excel file in Colab
 PALLET_LENGTH = 1200  # mm (1.2 m)
@@ -14,35 +15,20 @@ PALLET_HEIGHT = 850   # mm (0.85 m)
 PALLET_MAX_WEIGHT = 9999999  # effectively ignore weight constraint
 NUM_PALLETS = 11       # Number of pallets provided for packing
 
-# --- Step 1: Load and rename columns ---
-df = pd.read_excel(FILE_PATH)
-df = df.rename(columns={
-    'Length (cm)': 'length_cm',
-    'Width (cm)': 'width_cm',
-    'Height (cm)': 'height_cm',
-    'External Volume (L)': 'volume_L',
-    'Max Load Capacity (kg)': 'max_load_kg',
-    'Fragile': 'fragile',
-    'Stackable': 'stackable',
-    'Box ID': 'box_id'
-})
+# --- Step 1: Load boxes ---
+boxes = BoxArrays.load(FILE_PATH)
 
 # --- Step 2: Basic Validation ---
-df['valid'] = (
-    (df['length_cm'] > 0) &
-    (df['width_cm'] > 0) &
-    (df['height_cm'] > 0) &
-    (df['volume_L'] > 0)
-)
-
-if not df['valid'].all():
+valid = boxes.valid()
+
+if not valid.all():
     print("❌ Validation failed: some boxes have invalid dimensions or volume.")
-    print(df[~df['valid']])
+    print(boxes.frame(~valid))
 else:
     print("✅ All boxes passed basic validation.")
 
-print(f"\n📦 Total boxes: {len(df)}")
-print(f"📏 Total volume: {df['volume_L'].sum():,.2f} L")
+print(f"\n📦 Total boxes: {len(boxes)}")
+print(f"📏 Total volume: {boxes.volume.sum():,.2f} L")
 
 # --- Step 3: Initialize Packer and add pallets (bins) ---
 packer = Packer()
@@ -58,13 +44,15 @@ for i in range(NUM_PALLETS):
 
 # --- Step 4: Add boxes (items) ---
 packer.items.clear()
-for idx, row in df.iterrows():
+for name, width, height, length, weight in zip(
+    boxes.box_ids().tolist(), boxes.width.tolist(), boxes.height.tolist(), boxes.length.tolist(), boxes.max_load.tolist()
+):
     packer.add_item(Item(
-        name=row['box_id'],
-        width=row['width_cm'] * 10,   # convert cm to mm
-        height=row['height_cm'] * 10,
-        depth=row['length_cm'] * 10,
-        weight=row['max_load_kg']
+        name=name,
+        width=width * 10,   # convert cm to mm
+        height=height * 10,
+        depth=length * 10,
+        weight=weight
     ))
 
 # --- Step 5: Run packing and time it ---
@@ -75,7 +63,7 @@ runtime = end_time - start_time
 
 # --- Step 6: Check packing completeness ---
 packed_boxes = sum(len(b.items) for b in packer.bins)
-unpacked_boxes = len(df) - packed_boxes
+unpacked_boxes = len(boxes) - packed_boxes
 
 if unpacked_boxes > 0:
     print(f"⚠️ Warning: {unpacked_boxes} boxes were not packed!")
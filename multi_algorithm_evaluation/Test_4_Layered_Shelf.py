@@ -1,41 +1,25 @@
-import pandas as pd
 import time
 
+from box_arrays import BoxArrays
+
 # --- Step 0: Timer ---
 start_time = time.time()
 
 # --- Step 1: Load Excel File ---
 file_path = "/content/boxes_100.xlsx"  # Adjust path accordingly
-df = pd.read_excel(file_path)
-
-# Rename for convenience
-df = df.rename(columns={
-    'Length (cm)': 'length_cm',
-    'Width (cm)': 'width_cm',
-    'Height (cm)': 'height_cm',
-    'External Volume (L)': 'volume_L',
-    'Max Load Capacity (kg)': 'max_load_kg',
-    'Fragile': 'fragile',
-    'Stackable': 'stackable',
-    'Box ID': 'box_id'
-})
+boxes = BoxArrays.load(file_path)
 
 # --- Step 2: Validation ---
-df['valid'] = (
-    (df['length_cm'] > 0) &
-    (df['width_cm'] > 0) &
-    (df['height_cm'] > 0) &
-    (df['volume_L'] > 0)
-)
-
-if not df['valid'].all():
+valid = boxes.valid()
+
+if not valid.all():
     print("❌ Validation failed: some boxes have invalid dimensions or volume.")
-    print(df[~df['valid']])
+    print(boxes.frame(~valid))
 else:
     print("✅ All boxes passed basic validation.")
 
-print(f"\n📦 Total boxes: {len(df)}")
-print(f"📏 Total volume: {df['volume_L'].sum():,.2f} L")
+print(f"\n📦 Total boxes: {len(boxes)}")
+print(f"📏 Total volume: {boxes.volume.sum():,.2f} L")
 
 # --- Step 3: Pallet dimensions in cm ---
 PALLET_LENGTH = 120
@@ -43,8 +27,10 @@ PALLET_WIDTH = 100
 PALLET_HEIGHT = 85
 
 # --- Step 4: Layered (Shelf) Packing ---
-# Sort boxes by height descending for shelf packing
-boxes_sorted = df.sort_values(by='height_cm', ascending=False).reset_index(drop=True)
+# Sort boxes by height descending for shelf packing (shelves and pallets hold box ids)
+order = boxes.sorted_by('height')
+widths = boxes.width.tolist()
+heights = boxes.height.tolist()
 
 pallets = []
 current_pallet = []
@@ -70,10 +56,9 @@ def start_new_shelf():
 pallet = start_new_pallet()
 shelf = start_new_shelf()
 
-for idx, box in boxes_sorted.iterrows():
-    box_length = box['length_cm']
-    box_width = box['width_cm']
-    box_height = box['height_cm']
+for box in order.tolist():
+    box_width = widths[box]
+    box_height = heights[box]
 
     # Check if box fits in current shelf width-wise
     if shelf['width_used'] + box_width <= PALLET_WIDTH:
@@ -127,7 +112,7 @@ utilizations = []
 box_counts = []
 
 for i, p in enumerate(pallets):
-    vol_used = sum(box['volume_L'] for box in p['boxes'])
+    vol_used = boxes.volume[p['boxes']].sum()
     pallet_volume = (PALLET_LENGTH * PALLET_WIDTH * PALLET_HEIGHT) / 1000  # L
     utilization = vol_used / pallet_volume
     utilizations.append(utilization)
@@ -147,5 +132,4 @@ print(f"⏱️ Runtime: {runtime:.3f} seconds")
 
 # --- Optional: Preview first pallet's boxes ---
 print("\n🔍 First pallet preview:")
-first_pallet_boxes = pd.DataFrame(pallets[0]['boxes'])
-print(first_pallet_boxes[['box_id', 'length_cm', 'width_cm', 'height_cm', 'volume_L', 'fragile']].head())
+print(boxes.frame(pallets[0]['boxes'][:5]))
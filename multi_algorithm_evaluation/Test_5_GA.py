@@ -1,19 +1,12 @@
-import pandas as pd
 import numpy as np
 import time
 
+from box_arrays import BoxArrays
+
 # --- Step 1: Load Dataset ---
 file_path = "/content/boxes_100.xlsx"  # Make sure to upload your file in Colab
-df = pd.read_excel(file_path)
-
-# Rename columns for convenience
-df = df.rename(columns={
-    'Length (cm)': 'length',
-    'Width (cm)': 'width',
-    'Height (cm)': 'height',
-    'External Volume (L)': 'volume',
-    'Box ID': 'box_id'
-})
+boxes = BoxArrays.load(file_path)
+volumes = boxes.volume.tolist()  # individuals are permutations of box ids into this list
 
 # --- Step 2: Constants ---
 PALLET_LENGTH = 120  # cm
@@ -31,8 +24,8 @@ def fitness(order):
     total_vol = 0
     pallets_used = 1
     current_vol = 0
-    for idx in order:
-        box_vol = df.iloc[idx]['volume']
+    for idx in order.tolist():
+        box_vol = volumes[idx]
         if current_vol + box_vol <= PALLET_VOLUME:
             current_vol += box_vol
         else:
@@ -85,7 +78,7 @@ def mutate(individual, mutation_rate):
 
 # --- Step 9: Genetic Algorithm ---
 def genetic_algorithm():
-    n_items = len(df)
+    n_items = len(boxes)
     population = init_population(POPULATION_SIZE, n_items)
     best_solution = None
     best_fitness = float('-inf')
@@ -123,8 +116,8 @@ def pack_into_pallets(order):
     current_pallet = []
     current_vol = 0
 
-    for idx in order:
-        box_vol = df.iloc[idx]['volume']
+    for idx in order.tolist():
+        box_vol = volumes[idx]
         if current_vol + box_vol <= PALLET_VOLUME:
             current_pallet.append(idx)
             current_vol += box_vol
@@ -147,7 +140,7 @@ utilizations = []
 box_counts = []
 
 for p in pallets:
-    vol_used = sum(df.iloc[idx]['volume'] for idx in p)
+    vol_used = boxes.volume[p].sum()
     utilization = vol_used / PALLET_VOLUME
     utilizations.append(utilization)
     box_counts.append(len(p))
@@ -1,35 +1,19 @@
-import pandas as pd
 import time
 import random
-from copy import deepcopy
+
+from box_arrays import BoxArrays
 
 # --- Step 1: Load your dataset ---
 file_path = "/content/boxes_100.xlsx"  # Upload this file to Colab files
 
-df = pd.read_excel(file_path)
-
-# Rename for convenience
-df = df.rename(columns={
-    'Box ID': 'box_id',
-    'Length (cm)': 'length_cm',
-    'Width (cm)': 'width_cm',
-    'Height (cm)': 'height_cm',
-    'External Volume (L)': 'volume_L',
-    'Max Load Capacity (kg)': 'max_load_kg',
-    'Fragile': 'fragile',
-    'Stackable': 'stackable',
-})
-
-# Convert Fragile and Stackable to boolean if necessary
-df['fragile'] = df['fragile'].astype(str).str.lower().map({'yes': True, 'no': False})
-df['stackable'] = df['stackable'].astype(str).str.lower().map({'yes': True, 'no': False})
-
-# Fill NAs if any
-df['fragile'] = df['fragile'].fillna(False)
-df['stackable'] = df['stackable'].fillna(True)
+box_arrays = BoxArrays.load(file_path)
 
-# Create box list with needed attributes
-boxes = df.to_dict('records')
+# Attributes as plain lists indexed by box id; pallets are lists of box ids
+volumes = box_arrays.volume.tolist()
+max_loads = box_arrays.max_load.tolist()
+fragile = box_arrays.fragile.tolist()
+stackable = box_arrays.stackable.tolist()
+boxes = list(range(len(box_arrays)))
 
 # --- Step 2: Constants ---
 PALLET_LENGTH = 120  # cm
@@ -44,19 +28,19 @@ PALLET_MAX_WEIGHT = None  # e.g., 1000  # kg, or None to ignore
 
 def is_valid_pallet(pallet):
     # Check volume
-    total_vol = sum(box['volume_L'] for box in pallet)
+    total_vol = sum(volumes[box] for box in pallet)
     if total_vol > PALLET_VOLUME_L:
         return False
     # Check weight if needed
     if PALLET_MAX_WEIGHT is not None:
-        total_weight = sum(box['max_load_kg'] for box in pallet)
+        total_weight = sum(max_loads[box] for box in pallet)
         if total_weight > PALLET_MAX_WEIGHT:
             return False
     # Fragile boxes should be on top: simplistic check - no fragile box below non-fragile
     # For demo: If any fragile box and any non-stackable box in same pallet, reject
-    fragile_boxes = [box for box in pallet if box['fragile']]
+    fragile_boxes = [box for box in pallet if fragile[box]]
     if fragile_boxes:
-        non_stackable = [box for box in pallet if not box['stackable']]
+        non_stackable = [box for box in pallet if not stackable[box]]
         if non_stackable:
             return False
     return True
@@ -67,13 +51,13 @@ def initial_solution(boxes):
     current_pallet = []
     current_vol = 0
     for box in boxes:
-        if current_vol + box['volume_L'] <= PALLET_VOLUME_L:
+        if current_vol + volumes[box] <= PALLET_VOLUME_L:
             current_pallet.append(box)
-            current_vol += box['volume_L']
+            current_vol += volumes[box]
         else:
             pallets.append(current_pallet)
             current_pallet = [box]
-            current_vol = box['volume_L']
+            current_vol = volumes[box]
     if current_pallet:
         pallets.append(current_pallet)
     return pallets
@@ -81,7 +65,7 @@ def initial_solution(boxes):
 def evaluate(pallets):
     """Objective: minimize pallets, maximize utilization."""
     num_pallets = len(pallets)
-    utilizations = [sum(box['volume_L'] for box in p) / PALLET_VOLUME_L for p in pallets]
+    utilizations = [sum(volumes[box] for box in p) / PALLET_VOLUME_L for p in pallets]
     avg_util = sum(utilizations) / num_pallets
     score = num_pallets - avg_util  # Lower is better
     return score
@@ -93,7 +77,7 @@ def neighbors(solution):
         for j in range(i+1, len(solution)):
             for box_i in solution[i]:
                 for box_j in solution[j]:
-                    new_solution = deepcopy(solution)
+                    new_solution = [list(p) for p in solution]
                     new_solution[i].remove(box_i)
                     new_solution[j].remove(box_j)
                     new_solution[i].append(box_j)
@@ -143,7 +127,7 @@ end_time = time.time()
 # --- Step 6: Reporting ---
 
 num_pallets = len(final_solution)
-avg_util = sum(sum(box['volume_L'] for box in p) / PALLET_VOLUME_L for p in final_solution) / num_pallets
+avg_util = sum(sum(volumes[box] for box in p) / PALLET_VOLUME_L for p in final_solution) / num_pallets
 avg_box_count = sum(len(p) for p in final_solution) / num_pallets
 
 print("\n📝 Tabu Search Result:")
@@ -0,0 +1,99 @@
+# box_arrays.py
+"""
+Struct-of-arrays box container shared by the palletizing scripts.
+
+A picking list is held as one NumPy array per attribute instead of one pandas
+row (or dict) per box. A box is an integer id 0..n-1 into these arrays, so
+pallets, orders and GA individuals are plain lists / arrays of ints:
+
+    boxes = BoxArrays.load("boxes_100.xlsx")
+    order = boxes.sorted_by("volume")             # box ids, largest first
+    boxes.volume[order[:10]].sum()
+
+Attributes (all length n):
+    box_index   Box ID number (BX000123 -> 123); box_ids() renders the strings
+    length, width, height   cm, int64
+    volume      External Volume (L), float64
+    max_load    Max Load Capacity (kg), float64
+    fragile, stackable      bool (an empty Stackable cell counts as stackable, as before)
+
+Datasets are read through box_dataset.open_boxes(), i.e. from the memory-
+mapped .boxcol conversion cache, without building a DataFrame.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Shared dataset loader (box_dataset.py in the repository root)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from box_dataset import format_box_ids, frame_to_columns, open_boxes, read_frame
+
+FIELDS = ["box_index", "length", "width", "height", "volume", "max_load", "fragile", "stackable"]
+
+# BoxArrays field -> box_dataset column key
+_dataset_keys = {
+    "box_index": "box_index", "length": "length", "width": "width", "height": "height",
+    "volume": "ext_volume", "max_load": "max_load", "fragile": "fragile", "stackable": "stackable",
+}
+_dtypes = {
+    "box_index": np.int64, "length": np.int64, "width": np.int64, "height": np.int64,
+    "volume": np.float64, "max_load": np.float64, "fragile": bool, "stackable": bool,
+}
+
+
+class BoxArrays:
+    """The boxes of a picking list as parallel NumPy arrays, indexed by box id."""
+
+    def __init__(self, **arrays):
+        for name in FIELDS:
+            setattr(self, name, np.ascontiguousarray(arrays[name], dtype=_dtypes[name]))
+
+    @classmethod
+    def load(cls, file_name):
+        """Read any dataset format supported by box_dataset (.xlsx, .csv, .parquet, .ndjson, .boxcol)."""
+        dataset = open_boxes(file_name)
+        if dataset is None:
+            columns, _ = frame_to_columns(read_frame(file_name))
+            return cls(**{name: columns[key] for name, key in _dataset_keys.items()})
+        return cls(**{name: dataset.column(key) for name, key in _dataset_keys.items()})
+
+    def __len__(self):
+        return len(self.box_index)
+
+    def take(self, ids):
+        """A new BoxArrays with the boxes `ids` (in that order), renumbered 0..len(ids)-1."""
+        return BoxArrays(**{name: getattr(self, name)[ids] for name in FIELDS})
+
+    def valid(self):
+        """Mask of the boxes with positive dimensions and volume."""
+        return (self.length > 0) & (self.width > 0) & (self.height > 0) & (self.volume > 0)
+
+    def sorted_by(self, field, descending=True):
+        """Box ids ordered by `field`.
+
+        Ties come out in the same order as with DataFrame.sort_values(), so the
+        packings match the earlier pandas versions of the scripts.
+        """
+        values = getattr(self, field)
+        if not descending:
+            return values.argsort(kind="quicksort")
+        ids = np.arange(len(values))[::-1]
+        return ids[values[::-1].argsort(kind="quicksort")][::-1]
+
+    def box_ids(self, ids=None):
+        """Box ID strings ("BX000123") of `ids` (default: all boxes)."""
+        box_index = self.box_index if ids is None else self.box_index[ids]
+        return format_box_ids(box_index) if len(box_index) else np.array([], dtype=str)
+
+    def frame(self, ids):
+        """Small DataFrame of the boxes `ids` for printed previews (column names as in the reports)."""
+        return pd.DataFrame({
+            "box_id": self.box_ids(ids),
+            "length_cm": self.length[ids],
+            "width_cm": self.width[ids],
+            "height_cm": self.height[ids],
+            "volume_L": self.volume[ids],
+            "fragile": np.where(self.fragile[ids], "Yes", "No"),
+        })
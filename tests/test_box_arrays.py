@@ -0,0 +1,34 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "multi_algorithm_evaluation"))
+
+import box_dataset
+from box_arrays import BoxArrays
+from box_generator import columns_to_dataframe, generate_boxes_vectorized
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.setattr(box_dataset, "CACHE_DIR", str(tmp_path / "cache"))
+    df = columns_to_dataframe(generate_boxes_vectorized(6, seed=1))
+    df["Stackable"] = ["Yes", "No", None, "", "no", "YES"]
+    df["Fragile"] = ["Yes", "No", None, "", "no", "yes"]
+    path = tmp_path / "boxes.csv"
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("cache", [True, False])
+def test_missing_stackable_defaults_to_true(dataset, monkeypatch, cache):
+    if not cache:
+        monkeypatch.setattr(box_dataset, "cached_boxcol", lambda file_name: None)
+    boxes = BoxArrays.load(dataset)
+    assert boxes.stackable.tolist() == [True, False, True, True, False, True]
+    assert boxes.fragile.tolist() == [True, False, False, False, False, True]
+    assert boxes.stackable.dtype == np.bool_
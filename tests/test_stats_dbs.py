@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "boxes_database"))
+
+import box_dataset
+import Stats_DBs
+from box_generator import columns_to_dataframe, generate_boxes_vectorized
+
+
+@pytest.fixture
+def datasets(tmp_path, monkeypatch):
+    monkeypatch.setattr(box_dataset, "CACHE_DIR", str(tmp_path / "cache"))
+    corrupt = tmp_path / "corrupt.xlsx"
+    corrupt.write_text("Add Excel datasets to boxes_database folder\n")
+    valid = tmp_path / "valid.csv"
+    columns_to_dataframe(generate_boxes_vectorized(200, seed=1)).to_csv(valid, index=False)
+    return str(corrupt), str(valid)
+
+
+def test_cached_boxcol_returns_none_for_corrupt_xlsx(datasets):
+    corrupt, _ = datasets
+    assert box_dataset.cached_boxcol(corrupt) is None
+
+
+def test_collect_stats_skips_corrupt_xlsx(datasets, capsys):
+    corrupt, valid = datasets
+    results = Stats_DBs.collect_stats([corrupt, valid], workers=1)
+    assert list(results) == [valid]
+    assert results[valid]["items"] == 200
+    assert f"Skipping '{corrupt}'" in capsys.readouterr().out